@@ -8,6 +8,7 @@ from .user import user_index
 from .family import family_index, add_new_memory
 
 from .components import *
+from . import embeddings, ingest, metrics, tts
 
 
 class State(rx.State):
@@ -461,4 +462,17 @@ app = rx.App(
     )
 )
 
+
+def metrics_snapshot() -> dict:
+    """Counters and timings of this backend process, and its caches."""
+    return {
+        **metrics.snapshot(),
+        "embedding_cache": embeddings.get_cache().stats(),
+        "tts_cache": tts.speech_cache.stats(),
+        "ingest_jobs": ingest.job_queue.counts(),
+    }
+
+
 app.add_page(index)
+app.api.add_api_route("/metrics", metrics_snapshot, methods=["GET"])
+app.register_lifespan_task(ingest.run_workers)
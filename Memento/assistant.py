@@ -0,0 +1,132 @@
+"""The Memento chat model: static persona and tool, built once per process.
+
+The persona and the ``fileNameGrabber`` tool never change, so the
+``GenerativeModel`` is created once and reused for every turn.  The memories
+retrieved for a turn travel in a context block at the top of the resident's
+message, not in the system instruction.  The static prefix can optionally be
+stored with Gemini's context caching so it isn't re-sent on every call.
+"""
+
+import datetime
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+MODEL_NAME = "gemini-1.5-flash"
+# Context caching needs an explicitly versioned model, and Gemini only accepts
+# cached prefixes above a minimum size; if creating the cache fails we fall
+# back to sending the persona with each request.
+USE_CONTEXT_CACHE = os.environ.get("MEMENTO_CONTEXT_CACHE", "0") == "1"
+CACHED_MODEL_NAME = os.environ.get("MEMENTO_CACHED_MODEL", "models/gemini-1.5-flash-001")
+CONTEXT_CACHE_TTL = datetime.timedelta(
+    seconds=int(os.environ.get("MEMENTO_CONTEXT_CACHE_TTL", "3600"))
+)
+
+PERSONA = """
+You are Memento, a memory storage AI designed for elderly individuals in nursing homes.
+Your role is to help elderly users recall cherished memories by using voice recognition technology.
+When an elderly user speaks about a memory, you retrieve and display relevant images that are stored in the system.
+When an elderly user speaks about a memory, you don't just passively listen, you actively engage with their narrative.
+You retrieve and display relevant images, creating a rich, multi-sensory experience that brings their memories to life.
+Your responses should be carefully crafted based on the specific memory data provided, ensuring a personalized and accurate reflection of each individual's unique life experiences.
+You must always use the `fileNameGrabber` tool call.
+
+**Your responses should be based on the data provided about the memories**
+
+# Persona
+<persona>
+- Be Empathetic and Warm
+- Have a Clear Communication
+- Be Nostalgic and Personalized
+- Be Patient and Non-Rushed
+- Keep Your Tone Gentle, Slow-Paced, Comforting
+</persona>
+
+# Interaction Guidelines
+<guidelines>
+- Always greet the user with a warm welcome.
+- When a memory is mentioned, respond with excitement and genuine interest.
+- Do NOT mention the Image Summary directly, understand the Image Summary paired with the Description to understand the context.
+- Your response should contain about one paragraph long, try to elaborate things mentioned in the Description and Image Summary.
+- If a memory seems emotional, acknowledge the user's feelings with empathy.
+- Ask gentle follow-up questions to encourage more storytelling.
+- End each interaction on a positive note.
+</guidelines>
+
+# Memories Data
+Each message from the user starts with a <data> block holding the memories
+relevant to what they just said. Only the latest <data> block is current.
+""".strip()
+
+
+def fileNameGrabber(image_name: str) -> str:
+    """Grabs the Image Name of the most relevant memory created in your response.
+
+    Args:
+        image_name: The ImageName of the memory your response is mostly about.
+
+    Returns:
+        A string containing the image_name of the most relevant memory in your response.
+    """
+    return image_name
+
+
+def format_memories(memories: list[dict]) -> str:
+    """Render retrieved memories for the per-turn context block."""
+    output = ""
+    for i, memory in enumerate(memories):
+        output += f"""
+<memory{i}>
+Date: {memory["date"]}
+Description: {memory["description"]}
+ImageName: {memory["filename"]}
+Image Summary: {memory["summary"]}
+</memory{i}>
+"""
+    return output.strip()
+
+
+def build_turn_message(memories: str, user_text: str) -> str:
+    """The message sent for one turn: memory context, then what was said."""
+    return f"<data>\n{memories}\n</data>\n\n{user_text}"
+
+
+_lock = threading.Lock()
+_model = None
+_model_expires = None
+
+
+def _create_model():
+    if USE_CONTEXT_CACHE:
+        try:
+            cached = caching.CachedContent.create(
+                model=CACHED_MODEL_NAME,
+                display_name="memento-persona",
+                system_instruction=PERSONA,
+                tools=[fileNameGrabber],
+                ttl=CONTEXT_CACHE_TTL,
+            )
+            # Refresh a minute before the provider drops the cache.
+            expires = time.monotonic() + CONTEXT_CACHE_TTL.total_seconds() - 60
+            return genai.GenerativeModel.from_cached_content(cached), expires
+        except Exception as e:
+            print(f"Context caching unavailable, sending the persona inline: {e}")
+
+    model = genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        system_instruction=PERSONA,
+        tools=[fileNameGrabber]
+    )
+    return model, None
+
+
+def get_model() -> genai.GenerativeModel:
+    """Return the shared chat model, creating it on first use."""
+    global _model, _model_expires
+    with _lock:
+        if _model is None or (_model_expires is not None and time.monotonic() > _model_expires):
+            _model, _model_expires = _create_model()
+        return _model
@@ -0,0 +1,257 @@
+"""Local audio preprocessing for the voice turn.
+
+Recorded chunks arrive as base64 data URLs and are decoded straight into
+pooled buffers.  Voice-activity detection then runs on the CPU before
+anything is uploaded.  Chunks without speech are dropped.  Leading and
+trailing silence is cut by remuxing the compressed packets, so the trimmed
+clip keeps the recorder's codec and bitrate.
+"""
+
+import binascii
+import io
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import unquote_to_bytes
+
+import av
+from av.error import FFmpegError
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# A frame is speech if it is this many dB above the chunk's noise floor...
+SPEECH_MARGIN_DB = float(os.environ.get("MEMENTO_VAD_MARGIN_DB", "12"))
+# ...and louder than this absolute level.
+MIN_SPEECH_DB = float(os.environ.get("MEMENTO_VAD_MIN_SPEECH_DB", "-45"))
+# Consecutive speech frames needed to count as speech rather than a click.
+MIN_SPEECH_FRAMES = int(os.environ.get("MEMENTO_VAD_MIN_SPEECH_FRAMES", "5"))
+# Audio kept around the detected speech so word edges aren't clipped.
+PADDING_SECONDS = float(os.environ.get("MEMENTO_VAD_PADDING_SECONDS", "0.25"))
+
+# Muxer for each recorder MIME subtype.
+_MUXERS = {"mp3": "mp3", "webm": "webm", "ogg": "ogg", "wav": "wav", "mp4": "mp4"}
+
+# Base64 characters decoded per step; a multiple of 4 so windows split cleanly.
+DECODE_WINDOW = 64 * 1024
+# Decode buffers kept around for reuse between chunks.
+MAX_POOLED_BUFFERS = int(os.environ.get("MEMENTO_AUDIO_POOLED_BUFFERS", "8"))
+
+
+class BufferPool:
+    """Reusable bytearrays so each chunk doesn't allocate a fresh one."""
+
+    def __init__(self, max_buffers: int = MAX_POOLED_BUFFERS):
+        self.max_buffers = max_buffers
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> bytearray:
+        with self._lock:
+            for i, buffer in enumerate(self._buffers):
+                if len(buffer) >= size:
+                    return self._buffers.pop(i)
+        return bytearray(size)
+
+    def give(self, buffer: bytearray) -> None:
+        with self._lock:
+            self._buffers.append(buffer)
+            if len(self._buffers) > self.max_buffers:
+                self._buffers.remove(min(self._buffers, key=len))
+
+
+buffer_pool = BufferPool()
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable, read-only file object over a memoryview, without copying it."""
+
+    def __init__(self, view):
+        self._view = memoryview(view)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        end = min(self._position + len(target), len(self._view))
+        count = end - self._position
+        target[:count] = self._view[self._position:end]
+        self._position = end
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+@dataclass
+class DecodedAudio:
+    mime_type: str
+    codec: str
+    audio_type: str
+    data: memoryview
+
+
+def parse_data_url_header(url: str):
+    """Return ``(mime_type, codec, is_base64, data_start)`` of a data URL."""
+    comma = url.find(",")
+    if not url.startswith("data:") or comma < 0:
+        raise ValueError("Not a data URL")
+    mime_type, *params = url[5:comma].split(";")
+    is_base64 = bool(params) and params[-1] == "base64"
+    codec = ""
+    for param in params:
+        if param.startswith("codecs="):
+            codec = param[len("codecs="):]
+    return mime_type or "text/plain", codec, is_base64, comma + 1
+
+
+def _decode_base64_into(url: str, start: int, buffer: bytearray) -> int:
+    position = 0
+    for offset in range(start, len(url), DECODE_WINDOW):
+        piece = binascii.a2b_base64(url[offset:offset + DECODE_WINDOW])
+        buffer[position:position + len(piece)] = piece
+        position += len(piece)
+    return position
+
+
+@contextmanager
+def decode_data_url(url: str, pool: BufferPool = buffer_pool):
+    """Decode a recorder data URL into a pooled buffer.
+
+    The header is parsed once and the base64 payload is decoded window by
+    window straight into the buffer, so apart from that buffer no full-size
+    copy of the audio is made.  The yielded ``DecodedAudio.data`` view is only
+    valid inside the ``with`` block.
+    """
+    mime_type, codec, is_base64, start = parse_data_url_header(url)
+    audio_type = mime_type.partition("/")[2]
+    if audio_type == "mpeg":
+        audio_type = "mp3"
+
+    if not is_base64:
+        yield DecodedAudio(mime_type, codec, audio_type, memoryview(unquote_to_bytes(url[start:])))
+        return
+
+    buffer = pool.take((len(url) - start) // 4 * 3 + 3)
+    view = memoryview(buffer)
+    try:
+        length = _decode_base64_into(url, start, buffer)
+        data = view[:length]
+        try:
+            yield DecodedAudio(mime_type, codec, audio_type, data)
+        finally:
+            data.release()
+    finally:
+        view.release()
+        pool.give(buffer)
+
+
+@dataclass
+class VadResult:
+    has_speech: bool
+    audio: bytes | memoryview
+    total_seconds: float = 0.0
+    speech_start: float = 0.0
+    speech_end: float = 0.0
+
+
+def decode_pcm(data: bytes | memoryview) -> np.ndarray:
+    """Decode any container the browser records into mono 16 kHz float PCM."""
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    samples = []
+    with av.open(BufferReader(data)) as container:
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                samples.append(resampled.to_ndarray().reshape(-1))
+    for resampled in resampler.resample(None):
+        samples.append(resampled.to_ndarray().reshape(-1))
+    if not samples:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(samples).astype(np.float32) / 32768.0
+
+
+def detect_speech(pcm: np.ndarray):
+    """Return ``(start, end)`` in seconds of the speech in ``pcm``, or None."""
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    count = len(pcm) // frame
+    if count == 0:
+        return None
+
+    frames = pcm[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    energy = 20 * np.log10(np.maximum(rms, 1e-10))
+    threshold = max(np.percentile(energy, 10) + SPEECH_MARGIN_DB, MIN_SPEECH_DB)
+    voiced = energy > threshold
+
+    # Keep only runs of at least MIN_SPEECH_FRAMES voiced frames.
+    first = last = None
+    run = 0
+    for i, is_voiced in enumerate(voiced):
+        run = run + 1 if is_voiced else 0
+        if run == MIN_SPEECH_FRAMES and first is None:
+            first = i - run + 1
+        if run >= MIN_SPEECH_FRAMES:
+            last = i
+    if first is None:
+        return None
+    return first * FRAME_SECONDS, (last + 1) * FRAME_SECONDS
+
+
+def remux_range(data: bytes | memoryview, audio_type: str, start: float, end: float) -> bytes:
+    """Copy the packets between ``start`` and ``end`` seconds without re-encoding."""
+    output = io.BytesIO()
+    with av.open(BufferReader(data)) as source:
+        in_stream = source.streams.audio[0]
+        with av.open(output, "w", format=_MUXERS[audio_type]) as target:
+            out_stream = target.add_stream(template=in_stream)
+            for packet in source.demux(in_stream):
+                if packet.dts is None or packet.pts is None:
+                    continue
+                timestamp = float(packet.pts * packet.time_base)
+                if timestamp < start or timestamp > end:
+                    continue
+                packet.stream = out_stream
+                target.mux(packet)
+    return output.getvalue()
+
+
+def trim_silence(data: bytes | memoryview, audio_type: str) -> VadResult:
+    """Run VAD on a recorded chunk and cut the silence around the speech.
+
+    Anything that can't be decoded is passed through untouched so the
+    transcriber still gets a chance at it.
+    """
+    try:
+        pcm = decode_pcm(data)
+    except (FFmpegError, ValueError) as e:
+        print(f"VAD could not decode {audio_type} chunk: {e}")
+        return VadResult(has_speech=True, audio=data)
+
+    total = len(pcm) / SAMPLE_RATE
+    speech = detect_speech(pcm)
+    if speech is None:
+        return VadResult(has_speech=False, audio=b"", total_seconds=total)
+
+    start = max(0.0, speech[0] - PADDING_SECONDS)
+    end = min(total, speech[1] + PADDING_SECONDS)
+    result = VadResult(
+        has_speech=True, audio=data, total_seconds=total,
+        speech_start=start, speech_end=end,
+    )
+    # Only bother remuxing if it removes a worthwhile amount of silence.
+    if audio_type in _MUXERS and end - start < 0.9 * total:
+        try:
+            result.audio = remux_range(data, audio_type, start, end)
+        except (FFmpegError, ValueError) as e:
+            print(f"VAD could not trim {audio_type} chunk: {e}")
+    return result
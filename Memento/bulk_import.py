@@ -0,0 +1,259 @@
+"""Import a folder or zip of photos as memories.
+
+    python -m Memento.bulk_import PHOTOS [--metadata dates.csv] [--checkpoint import.done]
+                                  [--batch-size 100] [--caption-concurrency N]
+                                  [--photo-index photos.sqlite3]
+
+``PHOTOS`` is a directory (searched recursively) or a ``.zip``.  The optional
+metadata file is a CSV with ``filename,date,description`` columns or a JSON
+list of objects with those keys (or a ``{filename: {...}}`` map); ``filename``
+is matched against the photo's path inside ``PHOTOS`` and then its base name.
+Photos without a date fall back to their EXIF capture date.
+
+Each photo goes through the same steps as an upload on
+``/family/new-memory`` (``photo_index.prepare_photo``, then ``ingest.caption``
+unless the photo was uploaded and captioned before), and memories are upserted
+``--batch-size`` at a time so embedding runs in large batches.  Every
+processed photo is appended to the checkpoint file, and a rerun skips them;
+ids are derived from the photo's content, so even a lost checkpoint doesn't
+duplicate memories.
+
+``run_import`` takes the collection, the captioner and the photo index as
+arguments, so it can run end to end against a local Chroma, a stand-in
+captioner and a scratch index (see ``tests/test_bulk_import.py``).
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass
+
+import google.generativeai as genai
+
+from . import ingest, memory_store
+from .embeddings import backoff_delay
+from .executor import run_blocking
+from .photo_index import INDEX_PATH, PhotoIndex, photo_index, prepare_photo
+from .schema import Memory
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic"}
+BATCH_SIZE = 100
+CAPTION_CONCURRENCY = ingest.CAPTION_CONCURRENCY
+CAPTION_ATTEMPTS = 3
+UPLOAD_DIR = os.environ.get("REFLEX_UPLOADED_FILES_DIR", "uploaded_files")
+
+
+@dataclass
+class ImportStats:
+    imported: int = 0
+    skipped: int = 0
+    unreadable: int = 0
+    uncaptioned: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.imported / self.seconds if self.seconds else 0.0
+        return (
+            f"Imported {self.imported} photos in {self.seconds:.1f}s ({rate:.2f} photos/s); "
+            f"{self.skipped} already imported, {self.unreadable} unreadable, "
+            f"{self.uncaptioned} without a caption"
+        )
+
+
+class PhotoSource:
+    """The photos in a directory (searched recursively) or a zip archive."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.archive = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def names(self) -> list[str]:
+        """Photo names relative to the source, in a stable order."""
+        if self.archive is not None:
+            names = [info.filename for info in self.archive.infolist() if not info.is_dir()]
+        else:
+            names = [
+                os.path.relpath(os.path.join(root, filename), self.path)
+                for root, _, filenames in os.walk(self.path)
+                for filename in filenames
+            ]
+        return sorted(
+            name for name in names
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            and not os.path.basename(name).startswith(".")
+        )
+
+    def read(self, name: str) -> bytes:
+        if self.archive is not None:
+            return self.archive.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+
+
+def load_metadata(path: str) -> dict:
+    """``{filename: {"date": ..., "description": ...}}`` from a CSV or JSON file."""
+    if not path:
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            rows = data if isinstance(data, list) else [
+                {"filename": filename, **fields} for filename, fields in data.items()
+            ]
+        else:
+            rows = list(csv.DictReader(f))
+    return {
+        row["filename"].strip(): {
+            "date": (row.get("date") or "").strip(),
+            "description": (row.get("description") or "").strip(),
+        }
+        for row in rows
+        if row.get("filename")
+    }
+
+
+def load_checkpoint(path: str) -> set:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def memory_id(data: bytes) -> str:
+    """The same photo always gets the same id."""
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, hashlib.sha256(data).hexdigest()))
+
+
+async def _caption(captioner, caption_input: bytes, slots: asyncio.Semaphore):
+    async with slots:
+        for attempt in range(CAPTION_ATTEMPTS):
+            try:
+                return await captioner(caption_input)
+            except Exception as e:
+                if attempt + 1 == CAPTION_ATTEMPTS:
+                    print(f"Captioning failed, importing without a caption: {e}")
+                    return None
+                await asyncio.sleep(backoff_delay(attempt))
+
+
+async def _prepare(source: PhotoSource, name: str, metadata: dict, upload_dir: str,
+                   captioner, slots: asyncio.Semaphore, captions: dict, index: PhotoIndex):
+    try:
+        data = await run_blocking(source.read, name)
+        id = memory_id(data)
+        photo, caption_input, taken = await prepare_photo(data, id, upload_dir, name, index)
+    except Exception as e:
+        print(f"Skipping unreadable {name}: {e}")
+        return name, None
+    fields = metadata.get(name) or metadata.get(os.path.basename(name)) or {}
+    memory = Memory(
+        id=id,
+        date=fields.get("date") or taken,
+        description=fields.get("description", ""),
+        **photo,
+    )
+    # Uploaded before and captioned: reuse its caption.
+    summary = index.summary(memory.photo_hash) or None
+    if summary is None and caption_input is not None:
+        # Copies of one photo in this import share a single caption call.
+        if memory.photo_hash not in captions:
+            captions[memory.photo_hash] = asyncio.ensure_future(
+                _caption(captioner, caption_input, slots)
+            )
+        summary = await captions[memory.photo_hash]
+        if summary is not None:
+            index.set_summary(memory.photo_hash, summary)
+    memory.summary = summary or ""
+    return name, (memory, summary is not None)
+
+
+async def run_import(source: str, collection, captioner=ingest.caption, metadata: dict = None,
+                     checkpoint: str = "", upload_dir: str = UPLOAD_DIR,
+                     batch_size: int = BATCH_SIZE,
+                     caption_concurrency: int = CAPTION_CONCURRENCY,
+                     index: PhotoIndex = None) -> ImportStats:
+    """Import every photo in ``source`` into ``collection``, recognising
+    photos stored before through ``index`` (``photo_index`` by default)."""
+    metadata = metadata or {}
+    index = index or photo_index
+    done = load_checkpoint(checkpoint)
+    photos = PhotoSource(source)
+    names = photos.names()
+    pending = [name for name in names if name not in done]
+    stats = ImportStats(skipped=len(names) - len(pending))
+    slots = asyncio.Semaphore(caption_concurrency)
+    captions = {}
+    os.makedirs(upload_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(pending), batch_size):
+            batch = await asyncio.gather(*(
+                _prepare(photos, name, metadata, upload_dir, captioner, slots, captions, index)
+                for name in pending[offset:offset + batch_size]
+            ))
+            stats.unreadable += sum(1 for _, result in batch if result is None)
+            stats.uncaptioned += sum(1 for _, result in batch if result and not result[1])
+            # Identical photos share an id, and one upsert can't repeat an id.
+            memories = list({result[0].id: result[0] for _, result in batch if result}.values())
+
+            if memories:
+                await run_blocking(
+                    collection.upsert,
+                    ids=[memory.id for memory in memories],
+                    documents=[memory.document() for memory in memories],
+                    metadatas=[memory.metadata() for memory in memories],
+                )
+                stats.imported += len(memories)
+            if checkpoint:
+                # Unreadable photos are recorded too; they would fail again.
+                with open(checkpoint, "a", encoding="utf-8") as f:
+                    f.writelines(f"{name}\n" for name, _ in batch)
+            print(f"{offset + len(batch)}/{len(pending)} photos processed, {stats.imported} imported")
+    finally:
+        photos.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="directory or .zip of photos")
+    parser.add_argument("--metadata", default="", help="CSV or JSON of filename, date, description")
+    parser.add_argument("--checkpoint", default="",
+                        help="file listing imported photos (default: SOURCE.imported)")
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--photo-index", default=INDEX_PATH,
+                        help="SQLite index of stored photos (default: MEMENTO_PHOTO_INDEX)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--caption-concurrency", type=int, default=CAPTION_CONCURRENCY,
+                        help="caption calls in flight (also capped by MEMENTO_CAPTION_CONCURRENCY)")
+    args = parser.parse_args()
+
+    genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+    stats = asyncio.run(run_import(
+        args.source,
+        memory_store.get_collection(),
+        metadata=load_metadata(args.metadata),
+        checkpoint=args.checkpoint or f"{args.source.rstrip(os.sep)}.imported",
+        upload_dir=args.upload_dir,
+        batch_size=args.batch_size,
+        caption_concurrency=args.caption_concurrency,
+        index=PhotoIndex(args.photo_index),
+    ))
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,29 @@ def create_navigation_link(link_text, path):
     )
 
 
+def upload_srcset(srcset):
+    """Turn ``images.srcset`` entries into upload URLs on the frontend."""
+    prefix = rx.get_upload_url("")
+    return rx.cond(srcset, prefix + srcset.split(", ").join(", " + prefix), "")
+
+
+def create_responsive_image(src, srcset_webp, srcset_jpeg, sizes, width="", height="", **props):
+    """A lazily loaded photo the browser picks the best-sized variant for."""
+    return rx.el.picture(
+        rx.el.source(type="image/webp", src_set=upload_srcset(srcset_webp), sizes=sizes),
+        rx.el.img(
+            src=rx.get_upload_url(src),
+            src_set=upload_srcset(srcset_jpeg),
+            sizes=sizes,
+            width=width,
+            height=height,
+            loading="lazy",
+            decoding="async",
+            **props,
+        ),
+    )
+
+
 def create_header():
     """Create the main header with logo and navigation links."""
     return rx.box(  # Use box to ensure full width
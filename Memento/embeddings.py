@@ -0,0 +1,269 @@
+"""Gemini embeddings with a persistent, content-addressed cache.
+
+Embeddings are looked up by ``(model, task_type, sha256(text))``, first in an
+in-memory LRU and then in a small SQLite file, so texts that have been embedded
+once (repeated questions, re-upserted memories) never leave the box again.
+"""
+
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from google.api_core import exceptions as google_exceptions
+import google.generativeai as genai
+
+from .sqlite import open_sqlite
+
+EMBEDDING_MODEL = 'models/embedding-001'
+TASK_TYPE = "retrieval_document"
+TITLE = "Custom query"
+
+CACHE_PATH = os.environ.get("MEMENTO_EMBEDDING_CACHE", "db_path/embedding_cache.sqlite3")
+# Upper bound on rows kept on disk; the least recently used rows go first.
+CACHE_MAX_ENTRIES = int(os.environ.get("MEMENTO_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+MEMORY_CACHE_SIZE = int(os.environ.get("MEMENTO_EMBEDDING_MEMORY_CACHE_SIZE", "2048"))
+
+# Texts per embed_content request and how many requests may be in flight.
+BATCH_SIZE = int(os.environ.get("MEMENTO_EMBEDDING_BATCH_SIZE", "100"))
+MAX_CONCURRENCY = int(os.environ.get("MEMENTO_EMBEDDING_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.environ.get("MEMENTO_EMBEDDING_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+
+# Errors worth retrying: rate limits, timeouts and server-side hiccups.
+TRANSIENT_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) embedding cache with hit/miss counters."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 memory_size: int = MEMORY_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    @staticmethod
+    def key(model: str, task_type: str, text: str) -> tuple:
+        return model, task_type, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_sqlite(self.path)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, task_type, text_hash)
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+        return self._db
+
+    def _remember(self, key: tuple, vector: list) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: list) -> dict:
+        """Return ``{key: vector}`` for every key that is cached."""
+        found = {}
+        with self._lock:
+            pending = {}
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    pending[key] = None
+
+            if pending:
+                db = self._conn()
+                now = time.time()
+                for key in pending:
+                    row = db.execute(
+                        "SELECT vector FROM embeddings WHERE model=? AND task_type=? AND text_hash=?",
+                        key,
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    vector = array("f", row[0]).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                    db.execute(
+                        "UPDATE embeddings SET last_used=? WHERE model=? AND task_type=? AND text_hash=?",
+                        (now, *key),
+                    )
+                db.commit()
+
+            for key in keys:
+                if key in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, items: dict) -> None:
+        """Store ``{key: vector}`` and evict old rows past ``max_entries``."""
+        if not items:
+            return
+        with self._lock:
+            db = self._conn()
+            now = time.time()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                [(*key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            for key, vector in items.items():
+                self._remember(key, list(vector))
+
+            count = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                # Trim to 90% of the cap so eviction doesn't run on every insert.
+                excess = count - int(self.max_entries * 0.9)
+                db.execute(
+                    """DELETE FROM embeddings WHERE rowid IN (
+                        SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?
+                    )""",
+                    (excess,),
+                )
+                self.evictions += excess
+            db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENCY, thread_name_prefix="embed"
+            )
+        return _pool
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY,
+                  cap: float = RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter for retry number ``attempt``."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# Custom Embedding Function for ChromaDB
+class GeminiEmbeddingFunction(EmbeddingFunction):
+    def __init__(self, model: str = EMBEDDING_MODEL, task_type: str = TASK_TYPE,
+                 title: str = TITLE, cache: EmbeddingCache = None,
+                 batch_size: int = BATCH_SIZE, max_retries: int = MAX_RETRIES):
+        self.model = model
+        self.task_type = task_type
+        self.title = title
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+
+    def _embed_batch(self, texts: list) -> list:
+        return genai.embed_content(
+            model=self.model,
+            content=texts,
+            task_type=self.task_type,
+            title=self.title
+        )["embedding"]
+
+    def _embed_with_retry(self, texts: list) -> list:
+        attempt = 0
+        while True:
+            try:
+                return self._embed_batch(texts)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"Embedding batch failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _embed(self, texts: list) -> list:
+        """Embed ``texts`` in batches of ``batch_size``, running batches
+        concurrently on the shared pool; results keep the input order."""
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_with_retry(batches[0])
+
+        vectors = []
+        for result in _get_pool().map(self._embed_with_retry, batches):
+            vectors.extend(result)
+        return vectors
+
+    def __call__(self, input: Documents) -> Embeddings:
+        cache = self.cache or get_cache()
+        keys = [cache.key(self.model, self.task_type, text) for text in input]
+        found = cache.get_many(keys)
+
+        # Embed each distinct uncached text once, even if repeated in ``input``.
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self._embed(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            cache.put_many(fresh)
+            found.update(fresh)
+
+        return [found[key] for key in keys]
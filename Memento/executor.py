@@ -0,0 +1,59 @@
+"""Bounded pools for blocking and CPU-bound work done from async event handlers.
+
+Reflex runs every session's handlers on one event loop, so a synchronous
+network call inside an ``async`` handler stalls all connected residents.
+Anything without a native async client goes through ``run_blocking``.
+
+CPU-bound work (decoding and resizing photos) holds the GIL, so threads
+don't help; it goes through ``run_in_process`` on a process pool instead.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BLOCKING_WORKERS = int(os.environ.get("MEMENTO_BLOCKING_WORKERS", "16"))
+CPU_WORKERS = int(os.environ.get("MEMENTO_CPU_WORKERS", str(os.cpu_count() or 2)))
+
+_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_WORKERS, thread_name_prefix="memento-io"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the shared pool and await the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Forking a process that runs threads (Reflex, this module's pool)
+            # can deadlock the child; spawn fresh interpreters instead.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+async def run_in_process(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in a worker process and await the result.
+
+    ``func`` must be a module-level function and its arguments and result
+    picklable.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_process_pool(), functools.partial(func, *args, **kwargs)
+    )
@@ -1,17 +1,16 @@
 import reflex as rx
 from rxconfig import config
-from datetime import datetime
+import asyncio
 import os
 
-from PIL import Image
-import io
 import requests
-import chromadb
-from chromadb import Documents, EmbeddingFunction, Embeddings
 import google.generativeai as genai
 import uuid
 from typing import List, TypedDict
 
+from . import images, ingest, memory_store, timeline
+from .photo_index import prepare_photo
+from .schema import Memory
 from .components import * 
 
 
@@ -52,69 +51,71 @@ def create_themed_page(content: rx.Component) -> rx.Component:
 # Replace with your actual API key securely
 # **Important**: Use environment variables in production
 genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
-text_to_img_model = genai.GenerativeModel("gemini-1.5-flash")
-
-
-# Custom Embedding Function for ChromaDB
-class GeminiEmbeddingFunction(EmbeddingFunction):
-    def __call__(self, input: Documents) -> Embeddings:
-        model = 'models/embedding-001'
-        title = "Custom query"
-        return genai.embed_content(
-            model=model,
-            content=input,
-            task_type="retrieval_document",
-            title=title
-        )["embedding"]
 
 
 # State Management for Family Memories
 class FamilyState(rx.State):
     data: List[dict[str, str]] = []
-
-    def get_data(self) -> None:
-        self.data = []
-        collection = chromadb.HttpClient(
-            host='localhost', port=8001
-        ).get_or_create_collection(
-            name="vectordb",
-            embedding_function=GeminiEmbeddingFunction()
+    # Where the next page starts; "" once the whole timeline is loaded.
+    cursor: str = ""
+    has_more: bool = False
+
+    def get_data(self):
+        # Memories still being ingested aren't in the store yet, nor are
+        # those whose ingest failed; list them first so the family sees
+        # their submission arrived.
+        pending = ingest.job_queue.pending_memories()
+        failed = ingest.job_queue.failed_memories()
+        self.data = [
+            {**timeline.to_row(memory.id, memory.metadata()), "status": label}
+            for memory, label in reversed(
+                [(memory, FAILED_LABEL) for memory in failed]
+                + [(memory, PENDING_LABEL) for memory in pending]
+            )
+        ]
+        self.cursor = ""
+        self._load_page()
+        # Once the first page has rendered, fetch the next one whenever the
+        # sentinel under the timeline scrolls into view.
+        return rx.call_script(INFINITE_SCROLL_SCRIPT)
+
+    def load_more(self) -> None:
+        if self.has_more:
+            self._load_page()
+
+    def _load_page(self) -> None:
+        rows, self.cursor = memory_store.run(
+            lambda collection: timeline.fetch_page(collection, self.cursor)
         )
-        results = collection.get()
-
-        documents = results.get("documents", [])
-        metadatas = results.get("metadatas", [])
-
-        for doc, metadata in zip(documents, metadatas):
-            try:
-                date_str, description, image_summary = doc.split('|', 2)
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                date_formatted = date_obj.strftime("%B %d, %Y")
-                image_filename = f"{str(metadata['filename'])}.jpg"
-                self.data.append({
-                    "date": date_formatted,
-                    "description": description,
-                    "image_filename": image_filename,
-                    "og_date": date_str,
-                })
-            except ValueError as e:
-                print(f"Error parsing document: {e}")
-                continue
-
-        # Sort the data by date in descending order (newest first)
-        self.data.sort(key=lambda x: x["og_date"], reverse=True)
-        print(self.data)
+        shown = {row["id"] for row in self.data}
+        rows = [row for row in rows if row["id"] not in shown]
+        statuses = ingest.job_queue.statuses([row["id"] for row in rows])
+        # Rows may be the timeline index's own dicts; don't modify them.
+        rows = [{**row, "status": INGEST_LABELS.get(statuses.get(row["id"]), "")} for row in rows]
+        self.data = self.data + rows
+        self.has_more = bool(self.cursor)
+
+
+PENDING_LABEL = "Being added..."
+FAILED_LABEL = "Couldn't be added yet; it will be tried again."
+INGEST_LABELS = {
+    ingest.FAILED: "The photo couldn't be described.",
+}
+
+INFINITE_SCROLL_SCRIPT = """
+window.mementoTimelineObserver && window.mementoTimelineObserver.disconnect();
+window.mementoTimelineObserver = new IntersectionObserver(
+    (entries) => entries.forEach((entry) => entry.isIntersecting && entry.target.click()),
+    {rootMargin: "800px"}
+);
+window.mementoTimelineObserver.observe(document.getElementById("timeline-load-more"));
+"""
 
 
 # Timeline Event Component
 # Timeline Event Component
 def TimelineEvent(event_data: dict[str, str]) -> rx.Component:
     date_formatted = event_data["date"]
-    filename = event_data["image_filename"]
-
-    # Generate the image URL and set a placeholder in case of error
-    image_url = rx.get_upload_url(filename)
-    placeholder_url = "/static/placeholder.jpg"
 
     return rx.box(
         rx.hstack(
@@ -158,20 +159,37 @@ def TimelineEvent(event_data: dict[str, str]) -> rx.Component:
             ),
             # Right side: Content
             rx.box(
-                rx.image(
-                    src=image_url,
-                    fallback=placeholder_url,
-                    width="100%",
-                    height="auto",
-                    border_radius="1rem",
-                    margin_bottom="0.5rem",
-                    object_fit="cover",
+                create_responsive_image(
+                    src=event_data["image_filename"],
+                    srcset_webp=event_data["srcset_webp"],
+                    srcset_jpeg=event_data["srcset_jpeg"],
+                    sizes=images.TIMELINE_SIZES,
+                    width=event_data["width"],
+                    height=event_data["height"],
+                    alt=event_data["description"],
+                    style={
+                        "width": "100%",
+                        "height": "auto",
+                        "border_radius": "1rem",
+                        "margin_bottom": "0.5rem",
+                        "object_fit": "cover",
+                    },
                 ),
                 rx.text(
                     event_data["description"],
                     padding="0.5rem 1rem",
                     color="#555",
                 ),
+                rx.cond(
+                    event_data["status"] != "",
+                    rx.text(
+                        event_data["status"],
+                        padding="0 1rem",
+                        font_size="0.875rem",
+                        font_style="italic",
+                        color="#6B7280",
+                    ),
+                ),
                 flex="1",  # Allow content to take up remaining space
             ),
             align_items="flex-start",
@@ -238,6 +256,19 @@ def family_index():
             margin_right="auto",
             padding="2rem",
         ),
+        # Clicked by the infinite-scroll observer; stays mounted (only
+        # hidden) so the observer keeps watching the same element.
+        rx.button(
+            "Load more memories",
+            id="timeline-load-more",
+            on_click=FamilyState.load_more,
+            display=rx.cond(FamilyState.has_more, "block", "none"),
+            background_color="#74452f",
+            color="#ffffff",
+            margin_left="auto",
+            margin_right="auto",
+            _hover={"background_color": "#5a3722"},
+        ),
         width="100%",
         max_width="1280px",
         margin_left="auto",
@@ -252,73 +283,88 @@ class NewMemory(rx.State):
     date: str = ""
     description: str = ""
     generated_uuid: str = ""
+    # One entry per uploaded file: {"name": ..., "status": ...}.
+    upload_progress: List[dict[str, str]] = []
 
-    def handle_submit(self, form_data: dict) -> None:
+    def handle_submit(self, form_data: dict, selected_files: List[str]):
         self.date = form_data["date"]
         self.description = form_data["description"]
 
-        # Connect to ChromaDB
-        collection = chromadb.HttpClient(
-            host='localhost', port=8001
-        ).get_or_create_collection(
-            name="vectordb",
-            embedding_function=GeminiEmbeddingFunction()
-        )
-
         self.generated_uuid = str(uuid.uuid4())
-
-        # Store document with date and description
-        docs = f"{self.date}|{self.description}|",
-
-        collection.upsert(
-            documents=docs,
-            metadatas=[{"filename": self.generated_uuid}],
-            ids=[self.generated_uuid],
-        )
-
-        return rx.redirect("/family")
-
-    async def handle_upload(self, files: List[rx.UploadFile]) -> None:
-        collection = chromadb.HttpClient(
-            host='localhost', port=8001
-        ).get_or_create_collection(
-            name="vectordb",
-            embedding_function=GeminiEmbeddingFunction()
-        )
-
-        for file in files:
-            upload_data = await file.read()
-            outfile = f"{rx.get_upload_dir()}/{self.generated_uuid}.jpg"
-
+        self.upload_progress = []
+
+        # With photos, handle_upload writes the memories once the images are
+        # processed.  Without, Reflex still calls it, with no files, and it
+        # returns straight away; the memory is queued here.
+        if not selected_files:
+            ingest.submit(Memory(
+                id=self.generated_uuid,
+                date=self.date,
+                description=self.description,
+                filename=self.generated_uuid,
+            ))
+            return rx.redirect("/family")
+
+    async def handle_upload(self, files: List[rx.UploadFile] = None):
+        """Turn every uploaded photo into its own memory, sharing the form's
+        date and description (and an album id when there are several)."""
+        if not files:
+            # handle_submit already queued the photo-less memory.
+            return
+        upload_dir = str(rx.get_upload_dir())
+        album = self.generated_uuid if len(files) > 1 else ""
+        self.upload_progress = [
+            {"name": file.filename or f"Photo {number}", "status": "Processing..."}
+            for number, file in enumerate(files, start=1)
+        ]
+        yield
+
+        async def add_photo(index: int, file: rx.UploadFile):
+            memory_id = self.generated_uuid if index == 0 else str(uuid.uuid4())
             try:
-                image = Image.open(io.BytesIO(upload_data))
-                if image.mode != "RGB":
-                    image = image.convert("RGB")
-                image.save(outfile, format="JPEG")
-            except Exception as e:
-                print(f"Error saving image: {e}")
-                continue
-
-            # Append the image description to the existing document
-            result_text = "No description available."  # Default value
-
-            try:
-                myfile = genai.upload_file(outfile, mime_type="image/jpeg")
-                result = text_to_img_model.generate_content(
-                    [myfile, "\n\n", "Please give me a description of this image as detailed as possible"]
+                # A photo uploaded before reuses the stored files and caption.
+                fields, caption_input, _ = await prepare_photo(
+                    await file.read(), memory_id, upload_dir, file.filename or "",
                 )
-                result_text = result.get("text", "No description available.")
             except Exception as e:
-                print(f"Error generating image description: {e}")
-
-            old_data = collection.get(ids=[self.generated_uuid])
-            docs = f"{old_data['documents'][0]}|{result_text}",
-
-            collection.upsert(
-                documents=docs,
-                metadatas=[{"filename": self.generated_uuid}],
-                ids=[self.generated_uuid],
+                print(f"Error saving image {file.filename}: {e}")
+                return index, None, False
+            memory = Memory(
+                id=memory_id,
+                date=self.date,
+                description=self.description,
+                album=album,
+                **fields,
             )
+            # The ingest workers caption the photo and write the memory once.
+            ingest.submit(memory, caption_input)
+            return index, memory, fields["filename"] != memory_id
+
+        added = 0
+        for finished in asyncio.as_completed(
+            [add_photo(index, file) for index, file in enumerate(files)]
+        ):
+            index, memory, duplicate = await finished
+            added += memory is not None
+            if memory is None:
+                status = "Couldn't read this image"
+            else:
+                status = "Added (uploaded before)" if duplicate else "Added"
+            self.upload_progress[index] = {
+                "name": self.upload_progress[index]["name"],
+                "status": status,
+            }
+            yield
+
+        if not added:
+            # Keep the description even if no photo could be used.
+            ingest.submit(Memory(
+                id=self.generated_uuid,
+                date=self.date,
+                description=self.description,
+                filename=self.generated_uuid,
+            ))
+        yield rx.redirect("/family")
 
 
 # Page for Adding a New Memory
@@ -401,8 +447,8 @@ def add_new_memory():
                         _hover={"background_color": "#5a3722"},
                     ),
                 ),
-                on_submit=[
-                    NewMemory.handle_submit,
+                on_submit=lambda form_data: [
+                    NewMemory.handle_submit(form_data, rx.selected_files("upload1")),
                     NewMemory.handle_upload(rx.upload_files(upload_id="upload1"))
                 ],
                 width="100%",
@@ -414,6 +460,22 @@ def add_new_memory():
                 border_radius="0.5rem",
                 box_shadow="0 4px 6px rgba(0, 0, 0, 0.1)",
             ),
+            rx.vstack(
+                rx.foreach(
+                    NewMemory.upload_progress,
+                    lambda item: rx.hstack(
+                        rx.text(item["name"], color="#4B5563"),
+                        rx.text(item["status"], color="#6B7280", font_style="italic"),
+                        justify="between",
+                        width="100%",
+                    ),
+                ),
+                width="100%",
+                max_width="600px",
+                margin_left="auto",
+                margin_right="auto",
+                padding="1rem",
+            ),
         ),
         width="100%",
         padding="2rem",
@@ -0,0 +1,68 @@
+"""Token-budgeted conversation history.
+
+The last ``HISTORY_TURNS`` exchanges are replayed verbatim.  Older exchanges
+are folded into a rolling summary, which drops its oldest lines once it
+outgrows ``SUMMARY_TOKEN_BUDGET``.  Everything is plain lists and strings so
+it can live in backend-only state vars and never be synced to the browser.
+"""
+
+import os
+import re
+
+from .tokens import estimate_tokens, truncate_tokens
+
+HISTORY_TURNS = int(os.environ.get("MEMENTO_HISTORY_TURNS", "4"))
+# Budget for the verbatim exchanges plus the summary.
+HISTORY_TOKEN_BUDGET = int(os.environ.get("MEMENTO_HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("MEMENTO_SUMMARY_TOKEN_BUDGET", "300"))
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.S)
+
+
+def _gist(text: str, max_tokens: int) -> str:
+    text = " ".join(text.split())
+    match = _FIRST_SENTENCE.match(text)
+    return truncate_tokens(match.group(1) if match else text, max_tokens)
+
+
+def summarize_exchange(user: str, model: str) -> str:
+    """A one-line gist of an exchange, for the rolling summary."""
+    return f"Resident: {_gist(user, 40)} Memento: {_gist(model, 30)}"
+
+
+def _fold(summary: str, exchange: tuple[str, str]) -> str:
+    line = summarize_exchange(*exchange)
+    summary = f"{summary}\n{line}" if summary else line
+    while estimate_tokens(summary) > SUMMARY_TOKEN_BUDGET and "\n" in summary:
+        summary = summary.split("\n", 1)[1]
+    return truncate_tokens(summary, SUMMARY_TOKEN_BUDGET, keep_end=True)
+
+
+def _tokens(exchanges: list[tuple[str, str]]) -> int:
+    return sum(estimate_tokens(user) + estimate_tokens(model) for user, model in exchanges)
+
+
+def add_exchange(exchanges: list[tuple[str, str]], summary: str,
+                 user: str, model: str) -> tuple[list[tuple[str, str]], str]:
+    """Append an exchange and fold old ones into the summary.
+
+    Returns the new ``(exchanges, summary)``; the inputs aren't modified.
+    """
+    exchanges = exchanges + [(user, model)]
+    while len(exchanges) > HISTORY_TURNS:
+        summary = _fold(summary, exchanges.pop(0))
+    while len(exchanges) > 1 and _tokens(exchanges) + estimate_tokens(summary) > HISTORY_TOKEN_BUDGET:
+        summary = _fold(summary, exchanges.pop(0))
+    return exchanges, summary
+
+
+def to_gemini_history(exchanges: list[tuple[str, str]], summary: str) -> list[dict]:
+    """The ``history`` argument for ``start_chat``."""
+    history = []
+    if summary:
+        history.append({"role": "user", "parts": f"Earlier in our conversation:\n{summary}"})
+        history.append({"role": "model", "parts": "Thank you, I remember that."})
+    for user, model in exchanges:
+        history.append({"role": "user", "parts": user})
+        history.append({"role": "model", "parts": model})
+    return history
@@ -0,0 +1,189 @@
+"""Sized copies of uploaded memory photos.
+
+Phone photos are several megabytes, and the timeline used to load every
+original.  At upload each photo is also saved as WebP and JPEG at a few
+widths (``{basename}_{width}.webp`` / ``.jpg`` next to the original), and the
+widths are stored with the memory so pages can hand the browser a ``srcset``
+and let it pick the smallest file that fills the slot.  Originals stay
+untouched for archival and for memories uploaded before this existed.
+
+The captioner gets its own copy: rotated per the EXIF orientation tag and
+shrunk to ``CAPTION_LONG_EDGE`` pixels, which is all the detail it uses, so
+upload time and caption latency no longer grow with the camera's resolution.
+"""
+
+import io
+import os
+
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = [
+    int(width) for width in os.environ.get("MEMENTO_IMAGE_WIDTHS", "320,800,1600").split(",")
+]
+WEBP_QUALITY = int(os.environ.get("MEMENTO_WEBP_QUALITY", "80"))
+JPEG_QUALITY = int(os.environ.get("MEMENTO_JPEG_QUALITY", "82"))
+
+CAPTION_LONG_EDGE = int(os.environ.get("MEMENTO_CAPTION_LONG_EDGE", "1024"))
+CAPTION_QUALITY = int(os.environ.get("MEMENTO_CAPTION_QUALITY", "85"))
+
+# Slot widths: full width on phones, the timeline column on larger screens.
+TIMELINE_SIZES = "(max-width: 768px) 100vw, 760px"
+DISPLAY_SIZES = "(max-width: 800px) 100vw, 800px"
+
+
+def normalize(image: Image.Image) -> Image.Image:
+    """Apply the EXIF orientation and convert to RGB.
+
+    Phones store portrait shots as landscape pixels plus an orientation tag;
+    anything that drops the tag (re-encoding, resizing) shows them sideways.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def caption_jpeg(image: Image.Image) -> bytes:
+    """A normalized ``image`` shrunk to ``CAPTION_LONG_EDGE``, as JPEG bytes."""
+    if max(image.size) > CAPTION_LONG_EDGE:
+        image = image.copy()
+        image.thumbnail((CAPTION_LONG_EDGE, CAPTION_LONG_EDGE), Image.Resampling.LANCZOS,
+                        reducing_gap=3.0)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=CAPTION_QUALITY)
+    return buffer.getvalue()
+
+
+def variant_name(basename: str, width: int, ext: str) -> str:
+    return f"{basename}_{width}.{ext}"
+
+
+def save_variants(image: Image.Image, basename: str, directory: str) -> list[int]:
+    """Write the WebP and JPEG variants of ``image`` and return their widths.
+
+    Widths larger than the photo are capped at its own width, so a small
+    photo still gets (one) compressed variant and is never upscaled.
+    """
+    widths = sorted({min(width, image.width) for width in VARIANT_WIDTHS})
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        resized.save(
+            os.path.join(directory, variant_name(basename, width, "webp")),
+            format="WEBP", quality=WEBP_QUALITY, method=4,
+        )
+        resized.save(
+            os.path.join(directory, variant_name(basename, width, "jpg")),
+            format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True,
+        )
+    return widths
+
+
+def encode_widths(widths: list[int]) -> str:
+    """Chroma metadata can't hold lists; widths are stored as ``"320,800"``."""
+    return ",".join(str(width) for width in widths)
+
+
+def decode_widths(variants: str) -> list[int]:
+    return [int(width) for width in variants.split(",") if width]
+
+
+def srcset(basename: str, variants: str, ext: str) -> str:
+    """The ``srcset`` for a memory's variants, or "" if it has none.
+
+    Entries name the upload (``photo_320.webp 320w``) without its URL; the
+    frontend prefixes each one with ``rx.get_upload_url``, which resolves the
+    backend against the page's host the way a plain ``src`` does.
+    """
+    return ", ".join(
+        f"{variant_name(basename, width, ext)} {width}w"
+        for width in decode_widths(variants)
+    )
+
+
+def fallback_src(basename: str, variants: str, original: str) -> str:
+    """What to put in ``src``: the middle JPEG variant, else the original."""
+    widths = decode_widths(variants)
+    if not widths:
+        return original
+    return variant_name(basename, widths[len(widths) // 2], "jpg")
+
+
+def taken_date(image: Image.Image) -> str:
+    """The EXIF capture date as ``YYYY-MM-DD``, or "" if there is none."""
+    try:
+        exif = image.getexif()
+        # DateTimeOriginal (Exif IFD), else the file's DateTime.
+        value = exif.get_ifd(0x8769).get(0x9003) or exif.get(0x0132) or ""
+    except Exception:
+        return ""
+    date = str(value)[:10].replace(":", "-")
+    return date if len(date) == 10 and date[:4].isdigit() and date != "0000-00-00" else ""
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """64-bit difference hash as 16 hex digits.
+
+    Each bit says whether a pixel of a 9x8 grayscale thumbnail is brighter
+    than its right neighbour, so re-encoding, resizing and small edits flip
+    only a few bits; compare hashes with ``hamming``.
+    """
+    small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            bits = bits << 1 | (left > right)
+    return f"{bits:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def prepare_upload(data: bytes, basename: str, directory: str, filename: str = "",
+                   find_similar=None) -> dict:
+    """Store one uploaded photo and return what its memory and caption need.
+
+    Keeps the upload untouched (byte for byte as ``{basename}.jpg`` if it is
+    a JPEG, else as ``{basename}_original{ext}`` next to a converted JPEG),
+    writes the variants and builds the caption input; ``taken`` is the EXIF
+    capture date, for callers without a date of their own.  CPU bound and
+    picklable, so it runs on the process pool.
+
+    ``find_similar(phash)`` may name an already stored photo that looks the
+    same; then nothing is written and only ``duplicate_of`` (and ``phash``
+    and ``taken``) is returned.
+    """
+    original = Image.open(io.BytesIO(data))
+    image = normalize(original)
+    phash = perceptual_hash(image)
+    if find_similar is not None:
+        match = find_similar(phash)
+        if match:
+            return {"duplicate_of": match, "phash": phash, "taken": taken_date(original)}
+
+    outfile = os.path.join(directory, f"{basename}.jpg")
+    if original.format == "JPEG":
+        # Browsers honour the orientation tag themselves.
+        with open(outfile, "wb") as f:
+            f.write(data)
+    else:
+        extension = os.path.splitext(filename)[1].lower() or ".img"
+        with open(os.path.join(directory, f"{basename}_original{extension}"), "wb") as f:
+            f.write(data)
+        image.save(outfile, format="JPEG")
+    widths = save_variants(image, basename, directory)
+    return {
+        "image": f"{basename}.jpg",
+        "thumbnail": variant_name(basename, widths[0], "jpg"),
+        "width": image.width,
+        "height": image.height,
+        "variants": encode_widths(widths),
+        "caption_input": caption_jpeg(image),
+        "taken": taken_date(original),
+        "phash": phash,
+    }
@@ -0,0 +1,413 @@
+"""Durable background ingest of uploaded memory photos.
+
+Captioning a photo and upserting (and so embedding) the finished memory took
+two or three remote calls inside the upload handler: the family member
+waited on all of them, and a failure silently left the memory without its
+description.  The upload handler now only saves the image files and queues a
+job in a local SQLite table; ``WORKERS`` asyncio tasks claim jobs, caption,
+upsert and update the timeline index.  Failed jobs are retried with backoff
+up to ``MAX_ATTEMPTS`` times, jobs a crash left running are requeued once
+their ``LEASE_TIMEOUT`` runs out, and ``JobQueue.statuses`` tells the timeline where each
+memory's ingest stands.  A job that gave up before its memory was written
+(say, through a long Chroma outage) is listed by ``failed_memories`` and
+tried again every ``FAILED_RETRY_INTERVAL``, so a submission is never lost.
+
+A job is also the only writer of its memory: the form and the photo results
+are gathered into one ``Memory`` and ``submit`` queues it, and the worker
+upserts it exactly once, complete, so it is embedded once and retrieval
+never sees a half-written record.  Until then the family timeline shows it
+from ``pending_memories``.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+import google.generativeai as genai
+
+from . import memory_store, metrics, timeline
+from .embeddings import backoff_delay
+from .executor import run_blocking
+from .photo_index import photo_index
+from .schema import Memory
+from .sqlite import open_sqlite
+
+QUEUE_PATH = os.environ.get("MEMENTO_INGEST_QUEUE", "db_path/ingest_jobs.sqlite3")
+WORKERS = int(os.environ.get("MEMENTO_INGEST_WORKERS", "4"))
+# Caption calls in flight at once, across all workers.
+CAPTION_CONCURRENCY = int(os.environ.get("MEMENTO_CAPTION_CONCURRENCY", "4"))
+MAX_ATTEMPTS = int(os.environ.get("MEMENTO_INGEST_MAX_ATTEMPTS", "5"))
+# Idle workers look for due retries this often; new jobs wake them at once.
+POLL_INTERVAL = 1.0
+# A duplicate photo checks this often whether the upload ahead of it is captioned.
+PENDING_RETRY_INTERVAL = 5.0
+# A running job not updated for this long is taken to have lost its worker.
+LEASE_TIMEOUT = float(os.environ.get("MEMENTO_INGEST_LEASE_TIMEOUT", "600"))
+# Backoff between attempts; longer than the embedding retries, since a failed
+# attempt usually means the memory store is down rather than a rate limit.
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 300.0
+# Jobs that failed without writing their memory start over this often.
+FAILED_RETRY_INTERVAL = float(os.environ.get("MEMENTO_INGEST_FAILED_RETRY_INTERVAL", "900"))
+
+CAPTION_MODEL = "gemini-1.5-flash"
+CAPTION_PROMPT = "Please give me a description of this image as detailed as possible"
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    memory: Memory
+    # None for memories without a photo.
+    caption_input: bytes
+    attempts: int
+
+
+class CaptionFailed(Exception):
+    """The memory was written, but without a caption."""
+
+
+class CaptionPending(Exception):
+    """An earlier upload of the same photo is still being captioned."""
+
+
+class JobQueue:
+    """Ingest jobs in a SQLite table, safe to share between threads."""
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+        # Set by enqueue so idle workers don't wait out POLL_INTERVAL.
+        self.wakeup = asyncio.Event()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_sqlite(self.path)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    memory_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    caption_input BLOB,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_after REAL NOT NULL,
+                    error TEXT NOT NULL DEFAULT '',
+                    updated REAL NOT NULL,
+                    written INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "written" not in columns:
+                # Queues created before jobs recorded whether their memory was written.
+                self._db.execute("ALTER TABLE jobs ADD COLUMN written INTEGER NOT NULL DEFAULT 0")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_after)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_memory ON jobs (memory_id)"
+            )
+        return self._db
+
+    def enqueue(self, memory: Memory, caption_input: bytes = None) -> int:
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            with db:
+                cursor = db.execute(
+                    "INSERT INTO jobs (memory_id, payload, caption_input, status, run_after, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (memory.id, json.dumps(asdict(memory)), caption_input, QUEUED, now, now),
+                )
+        self.wakeup.set()
+        metrics.incr("ingest_enqueued")
+        return cursor.lastrowid
+
+    def claim(self):
+        """Mark the oldest due job as running and return it, or None.
+
+        One ``UPDATE ... RETURNING`` statement, so two processes sharing the
+        queue can't both claim the same job.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            with db:
+                row = db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ?"
+                    " WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ?"
+                    " ORDER BY id LIMIT 1) AND status = ?"
+                    " RETURNING id, payload, caption_input, attempts",
+                    (RUNNING, now, QUEUED, now, QUEUED),
+                ).fetchone()
+        if row is None:
+            return None
+        id, payload, caption_input, attempts = row
+        return Job(id, Memory(**json.loads(payload)), caption_input, attempts)
+
+    def save(self, job: Job) -> None:
+        """Persist progress (e.g. a finished caption) so a retry skips it."""
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    "UPDATE jobs SET payload = ?, updated = ? WHERE id = ?",
+                    (json.dumps(asdict(job.memory)), time.time(), job.id),
+                )
+
+    def mark_written(self, job: Job) -> None:
+        """Record that the job's memory is in the store, whatever happens next."""
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    "UPDATE jobs SET written = 1, updated = ? WHERE id = ?", (time.time(), job.id)
+                )
+
+    def complete(self, job: Job) -> None:
+        with self._lock:
+            db = self._conn()
+            with db:
+                # The caption input is only needed until the job succeeds.
+                db.execute(
+                    "UPDATE jobs SET status = ?, caption_input = NULL, error = '', updated = ?"
+                    " WHERE id = ?",
+                    (DONE, time.time(), job.id),
+                )
+
+    def fail(self, job: Job, error: str, final: bool = False) -> bool:
+        """Record a failed attempt; returns whether the job will be retried."""
+        retry = not final and job.attempts < MAX_ATTEMPTS
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    "UPDATE jobs SET status = ?, run_after = ?, error = ?, updated = ? WHERE id = ?",
+                    (QUEUED if retry else FAILED,
+                     now + backoff_delay(job.attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY),
+                     error, now, job.id),
+                )
+        return retry
+
+    def defer(self, job: Job, delay: float) -> None:
+        """Put ``job`` back to run after ``delay`` without using up an attempt."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts - 1, run_after = ?, updated = ?"
+                    " WHERE id = ?",
+                    (QUEUED, now + delay, now, job.id),
+                )
+
+    def captioning(self, photo_hash: str, before: int) -> bool:
+        """Whether a job older than ``before`` for the same photo is unfinished."""
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT 1 FROM jobs WHERE status IN (?, ?) AND id < ?"
+                " AND json_extract(payload, '$.photo_hash') = ? LIMIT 1",
+                (QUEUED, RUNNING, before, photo_hash),
+            ).fetchone()
+        return row is not None
+
+    def requeue_running(self, lease: float = LEASE_TIMEOUT) -> int:
+        """Put back running jobs nobody has updated for ``lease`` seconds.
+
+        Fresher ones may belong to a live worker in another process.
+        """
+        with self._lock:
+            db = self._conn()
+            with db:
+                return db.execute(
+                    "UPDATE jobs SET status = ? WHERE status = ? AND updated < ?",
+                    (QUEUED, RUNNING, time.time() - lease),
+                ).rowcount
+
+    def retry_failed(self, interval: float = FAILED_RETRY_INTERVAL) -> int:
+        """Start over jobs that failed ``interval`` seconds ago or earlier
+        without writing their memory."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            with db:
+                return db.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, run_after = ?, updated = ?"
+                    " WHERE status = ? AND written = 0 AND updated < ?",
+                    (QUEUED, now, now, FAILED, now - interval),
+                ).rowcount
+
+    def statuses(self, memory_ids: list[str]) -> dict:
+        """``{memory_id: status}`` of each memory's latest job."""
+        if not memory_ids:
+            return {}
+        with self._lock:
+            rows = self._conn().execute(
+                f"SELECT memory_id, status FROM jobs WHERE memory_id IN"
+                f" ({','.join('?' * len(memory_ids))}) ORDER BY id",
+                memory_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def pending_memories(self) -> list[Memory]:
+        """Memories whose job hasn't written them yet, oldest first."""
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT payload FROM jobs WHERE status IN (?, ?) ORDER BY id", (QUEUED, RUNNING)
+            ).fetchall()
+        return [Memory(**json.loads(payload)) for (payload,) in rows]
+
+    def failed_memories(self) -> list[Memory]:
+        """Memories whose job gave up before writing them, oldest first."""
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT payload FROM jobs WHERE status = ? AND written = 0 AND memory_id NOT IN"
+                " (SELECT memory_id FROM jobs WHERE written = 1) ORDER BY id",
+                (FAILED,),
+            ).fetchall()
+        return [Memory(**json.loads(payload)) for (payload,) in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._conn().execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall())
+
+
+job_queue = JobQueue()
+caption_model = genai.GenerativeModel(CAPTION_MODEL)
+_caption_slots = asyncio.Semaphore(CAPTION_CONCURRENCY)
+
+
+async def caption(image_jpeg: bytes) -> str:
+    async with _caption_slots:
+        start = time.perf_counter()
+        result = await caption_model.generate_content_async(
+            [{"mime_type": "image/jpeg", "data": image_jpeg}, "\n\n", CAPTION_PROMPT]
+        )
+    latency = time.perf_counter() - start
+    metrics.observe("caption_latency", latency)
+    metrics.observe("caption_bytes", len(image_jpeg))
+    return result.text
+
+
+def submit(memory: Memory, caption_input: bytes = None) -> int:
+    """Queue ``memory`` to be captioned (if it has a photo) and written."""
+    return job_queue.enqueue(memory, caption_input)
+
+
+async def ingest_memory(job: Job, queue: JobQueue) -> None:
+    """Caption the photo, then write the finished memory (embedding it)."""
+    memory = job.memory
+    caption_failed = None
+    if memory.photo_hash and not memory.summary:
+        # Another upload of the same photo may have been captioned already.
+        memory.summary = photo_index.summary(memory.photo_hash)
+        if memory.summary:
+            metrics.incr("captions_reused")
+            queue.save(job)
+    if memory.photo_hash and not memory.summary and queue.captioning(memory.photo_hash, job.id):
+        # An earlier upload of this photo is ahead in the queue: wait for its caption.
+        raise CaptionPending(memory.photo_hash)
+    if job.caption_input is not None and not memory.summary:
+        try:
+            memory.summary = await caption(job.caption_input)
+            queue.save(job)
+            if memory.photo_hash:
+                photo_index.set_summary(memory.photo_hash, memory.summary)
+        except Exception as e:
+            if job.attempts < MAX_ATTEMPTS:
+                raise
+            # Out of retries: keep the memory, just without a caption.
+            caption_failed = e
+    elif memory.photo_hash and not memory.summary:
+        # A duplicate of a photo that was never captioned, with nothing to caption.
+        caption_failed = f"no caption for photo {memory.photo_hash}"
+
+    await run_blocking(memory_store.run, lambda collection: collection.upsert(
+        documents=[memory.document()],
+        metadatas=[memory.metadata()],
+        ids=[memory.id],
+    ))
+    queue.mark_written(job)
+    timeline.record(memory_store.get_collection(), memory)
+    if caption_failed is not None:
+        raise CaptionFailed(str(caption_failed))
+
+
+async def _work_once(queue: JobQueue, handle) -> None:
+    queue.wakeup.clear()
+    job = queue.claim()
+    if job is None:
+        try:
+            await asyncio.wait_for(queue.wakeup.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        return
+
+    start = time.perf_counter()
+    try:
+        await handle(job, queue)
+    except CaptionPending:
+        queue.defer(job, PENDING_RETRY_INTERVAL)
+        metrics.incr("ingest_deferred")
+    except Exception as e:
+        # The memory is written either way; a missing caption isn't retried.
+        retry = queue.fail(job, repr(e), final=isinstance(e, CaptionFailed))
+        metrics.incr("ingest_retries" if retry else "ingest_failures")
+        print(f"Ingest of {job.memory.id} failed (attempt {job.attempts}"
+              f"{', will retry' if retry else ', giving up'}): {e}")
+    else:
+        queue.complete(job)
+        metrics.incr("ingest_done")
+        metrics.observe("ingest_seconds", time.perf_counter() - start)
+
+
+async def _work(queue: JobQueue, handle) -> None:
+    errors = 0
+    while True:
+        try:
+            await _work_once(queue, handle)
+            errors = 0
+        except Exception as e:
+            # The queue itself failed (e.g. "database is locked" while another
+            # process writes).  A job caught mid-way is requeued when its
+            # lease expires; this worker backs off and carries on.
+            metrics.incr("ingest_queue_errors")
+            print(f"Ingest queue error: {e!r}")
+            await asyncio.sleep(backoff_delay(errors, POLL_INTERVAL, RETRY_MAX_DELAY))
+            errors += 1
+
+
+async def _requeue_expired(queue: JobQueue) -> None:
+    """Hand the jobs of crashed workers, in any process, and jobs that gave
+    up before writing their memory back to the queue."""
+    while True:
+        try:
+            requeued = queue.requeue_running()
+            if requeued:
+                print(f"Requeued {requeued} interrupted ingest jobs")
+            retried = queue.retry_failed()
+            if retried:
+                metrics.incr("ingest_failed_retried", retried)
+                print(f"Retrying {retried} ingest jobs whose memory was never written")
+            if requeued or retried:
+                queue.wakeup.set()
+        except Exception as e:
+            metrics.incr("ingest_queue_errors")
+            print(f"Ingest queue error: {e!r}")
+        await asyncio.sleep(min(LEASE_TIMEOUT, FAILED_RETRY_INTERVAL) / 2)
+
+
+async def run_workers(workers: int = WORKERS, handle=ingest_memory, queue: JobQueue = None) -> None:
+    """Process ingest jobs forever with ``workers`` concurrent workers."""
+    queue = queue or job_queue
+    await asyncio.gather(_requeue_expired(queue), *(_work(queue, handle) for _ in range(workers)))
@@ -0,0 +1,106 @@
+"""Process-wide access to the Chroma memory store.
+
+Every event handler used to build its own ``chromadb.HttpClient`` and look the
+collection up again.  This module keeps one client (and therefore one
+keep-alive HTTP session) per process together with a cached collection handle,
+checks the server's heartbeat periodically and transparently reconnects when
+the server has gone away.
+
+With ``CHROMA_MODE=embedded`` Chroma runs inside this process instead, as a
+``PersistentClient`` stored under ``CHROMA_PATH`` (``db_path`` by default):
+no separate server to run and no HTTP hop per query.  Only one process may
+open the store that way, so this suits single-node deployments with one
+backend worker, and command-line tools such as ``Memento.migrate`` and
+``Memento.bulk_import`` must run while the app is stopped.  The default,
+``http``, still talks to the server at ``CHROMA_HOST:CHROMA_PORT``.
+"""
+
+import os
+import threading
+import time
+
+import chromadb
+
+from .embeddings import GeminiEmbeddingFunction
+
+# "http" (a Chroma server) or "embedded" (in-process, persisted under CHROMA_PATH).
+CHROMA_MODE = os.environ.get("CHROMA_MODE", "http")
+CHROMA_PATH = os.environ.get("CHROMA_PATH", "db_path")
+CHROMA_HOST = os.environ.get("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.environ.get("CHROMA_PORT", "8001"))
+COLLECTION_NAME = "vectordb"
+
+# Seconds between heartbeats on an otherwise healthy connection.
+HEALTH_CHECK_INTERVAL = float(os.environ.get("CHROMA_HEALTH_CHECK_INTERVAL", "30"))
+
+
+_lock = threading.Lock()
+_client = None
+_collection = None
+_last_health_check = 0.0
+
+
+def _new_client():
+    if CHROMA_MODE == "embedded":
+        return chromadb.PersistentClient(path=CHROMA_PATH)
+    if CHROMA_MODE == "http":
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    raise ValueError(f"Unknown CHROMA_MODE {CHROMA_MODE!r}; expected 'http' or 'embedded'")
+
+
+def _connect():
+    global _client, _collection, _last_health_check
+    _client = _new_client()
+    _collection = _client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=GeminiEmbeddingFunction()
+    )
+    _last_health_check = time.monotonic()
+
+
+def _healthy() -> bool:
+    try:
+        _client.heartbeat()
+        return True
+    except Exception as e:
+        print(f"Memory store heartbeat failed: {e}")
+        return False
+
+
+def get_collection():
+    """Return the cached ``vectordb`` collection handle.
+
+    The connection is re-validated at most every ``HEALTH_CHECK_INTERVAL``
+    seconds; a failed heartbeat drops the client and reconnects.
+    """
+    global _last_health_check
+    with _lock:
+        if _collection is None:
+            _connect()
+        elif time.monotonic() - _last_health_check > HEALTH_CHECK_INTERVAL:
+            if _healthy():
+                _last_health_check = time.monotonic()
+            else:
+                _connect()
+        return _collection
+
+
+def reconnect():
+    """Force a new client and collection handle, e.g. after a failed request."""
+    with _lock:
+        _connect()
+    return _collection
+
+
+def run(operation):
+    """Call ``operation(collection)``, reconnecting and retrying once if the
+    store turns out to be unreachable."""
+    collection = get_collection()
+    try:
+        return operation(collection)
+    except Exception:
+        with _lock:
+            if _client is not None and _healthy():
+                raise
+        return operation(reconnect())
+
@@ -0,0 +1,44 @@
+"""In-process counters and timings for the voice and ingest pipelines.
+
+``GET /metrics`` on the backend returns ``snapshot()`` together with the
+embedding and speech cache statistics.
+"""
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_observations = {}
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Add ``amount`` to the counter ``name``."""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one sample (a latency, a size, ...) for ``name``."""
+    with _lock:
+        stats = _observations.get(name)
+        if stats is None:
+            _observations[name] = {
+                "count": 1, "total": value, "min": value, "max": value, "last": value
+            }
+            return
+        stats["count"] += 1
+        stats["total"] += value
+        stats["min"] = min(stats["min"], value)
+        stats["max"] = max(stats["max"], value)
+        stats["last"] = value
+
+
+def snapshot() -> dict:
+    """Return a copy of every counter and observation summary."""
+    with _lock:
+        observations = {
+            name: {**stats, "mean": stats["total"] / stats["count"]}
+            for name, stats in _observations.items()
+        }
+        return {"counters": dict(_counters), "observations": observations}
@@ -0,0 +1,75 @@
+"""Rewrite pipe-delimited memories into the structured schema.
+
+    python -m Memento.migrate [--dry-run] [--reembed] [--batch-size 200]
+
+By default the existing embeddings are kept, so migrating costs no embedding
+calls; ``--reembed`` embeds the new document text instead.
+"""
+
+import argparse
+import os
+
+import google.generativeai as genai
+
+from . import memory_store
+from .schema import Memory, is_current
+
+
+def migrate(collection, batch_size: int = 200, reembed: bool = False,
+            dry_run: bool = False) -> tuple[int, int]:
+    """Migrate every legacy record; returns ``(migrated, total)``."""
+    include = ["documents", "metadatas"] if reembed else ["documents", "metadatas", "embeddings"]
+    # Snapshot the ids first: paging by offset while upserting the same rows
+    # could skip or repeat records.
+    all_ids = collection.get(include=[])["ids"]
+    migrated = total = 0
+    for start in range(0, len(all_ids), batch_size):
+        batch = collection.get(ids=all_ids[start:start + batch_size], include=include)
+        ids = batch["ids"]
+        total += len(ids)
+
+        legacy = [i for i, metadata in enumerate(batch["metadatas"]) if not is_current(metadata)]
+        if not legacy:
+            continue
+        memories = [
+            Memory.from_record(ids[i], batch["documents"][i], batch["metadatas"][i])
+            for i in legacy
+        ]
+        migrated += len(memories)
+        if dry_run:
+            for memory in memories:
+                print(f"Would migrate {memory.id}: {memory.date} {memory.description[:40]!r}")
+            continue
+
+        upsert = {
+            "ids": [memory.id for memory in memories],
+            "documents": [memory.document() for memory in memories],
+            "metadatas": [memory.metadata() for memory in memories],
+        }
+        if not reembed:
+            upsert["embeddings"] = [batch["embeddings"][i] for i in legacy]
+        collection.upsert(**upsert)
+        print(f"Migrated {migrated} of {total} memories seen so far")
+    return migrated, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--reembed", action="store_true",
+                        help="embed the new document text instead of keeping the old vectors")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+    migrated, total = migrate(
+        memory_store.get_collection(),
+        batch_size=args.batch_size,
+        reembed=args.reembed,
+        dry_run=args.dry_run,
+    )
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {migrated} of {total} memories")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Recognise photos that were uploaded before.
+
+Relatives often upload the same picture more than once, and every copy used
+to get its own caption call, embedding input and set of files.  Every stored
+photo is recorded here with its SHA-256 and a perceptual hash
+(``images.perceptual_hash``).  ``prepare_photo`` checks a new upload against
+both: an exact copy is recognised before it is even decoded, and a
+re-encoded, resized or lightly edited copy (perceptual hashes within
+``NEAR_DUPLICATE_DISTANCE`` bits) before any file is written.  Either way the
+new memory points at the stored files, and the ingest worker reuses the
+stored caption instead of calling Gemini.  Until the stored photo has a
+caption, a duplicate also carries a caption input made from the stored
+variant, so it can still be captioned if the original never is.
+
+Near-duplicate lookup splits the 64-bit hash into eight bytes, each an
+indexed column: two hashes at most seven bits apart share at least one byte,
+so only photos matching on some byte are compared.
+"""
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from . import images, metrics
+from .executor import run_in_process
+from .sqlite import open_sqlite
+
+INDEX_PATH = os.environ.get("MEMENTO_PHOTO_INDEX", "db_path/photo_index.sqlite3")
+NEAR_DUPLICATE_DISTANCE = min(7, int(os.environ.get("MEMENTO_NEAR_DUPLICATE_DISTANCE", "6")))
+
+# The Memory fields a duplicate shares with the photo it copies.
+SHARED_FIELDS = ("filename", "image", "thumbnail", "width", "height", "variants")
+
+
+def _bands(phash: str) -> list[int]:
+    return [int(phash[i:i + 2], 16) for i in range(0, 16, 2)]
+
+
+class PhotoIndex:
+    """Stored photos by content hash and perceptual hash (SQLite)."""
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_sqlite(self.path)
+            self._db.execute(
+                f"""CREATE TABLE IF NOT EXISTS photos (
+                    sha256 TEXT PRIMARY KEY,
+                    phash TEXT NOT NULL,
+                    {', '.join(f'band{i} INTEGER NOT NULL' for i in range(8))},
+                    filename TEXT NOT NULL,
+                    image TEXT NOT NULL,
+                    thumbnail TEXT NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    variants TEXT NOT NULL,
+                    taken TEXT NOT NULL,
+                    summary TEXT NOT NULL DEFAULT '',
+                    added REAL NOT NULL
+                )"""
+            )
+            for i in range(8):
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS photos_band{i} ON photos (band{i})"
+                )
+        return self._db
+
+    def get(self, sha256: str):
+        """The stored photo's shared fields (plus ``taken``), or None."""
+        with self._lock:
+            db = self._conn()
+            row = db.execute(
+                f"SELECT {', '.join(SHARED_FIELDS)}, taken FROM photos WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(SHARED_FIELDS + ("taken",), row))
+
+    def find_similar(self, phash: str, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> str:
+        """The SHA-256 of the closest stored photo within ``max_distance``
+        bits of ``phash``, or ""."""
+        bands = _bands(phash)
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT sha256, phash FROM photos WHERE "
+                + " OR ".join(f"band{i} = ?" for i in range(8)),
+                bands,
+            ).fetchall()
+        best, best_distance = "", max_distance + 1
+        for sha256, candidate in rows:
+            distance = images.hamming(phash, candidate)
+            if distance < best_distance:
+                best, best_distance = sha256, distance
+        return best
+
+    def add(self, sha256: str, phash: str, fields: dict, taken: str = "") -> None:
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    f"INSERT OR IGNORE INTO photos (sha256, phash, "
+                    f"{', '.join(f'band{i}' for i in range(8))}, {', '.join(SHARED_FIELDS)},"
+                    f" taken, added) VALUES ({', '.join('?' * (2 + 8 + len(SHARED_FIELDS) + 2))})",
+                    (sha256, phash, *_bands(phash), *(fields[name] for name in SHARED_FIELDS),
+                     taken, time.time()),
+                )
+
+    def summary(self, sha256: str) -> str:
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT summary FROM photos WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def set_summary(self, sha256: str, summary: str) -> None:
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute(
+                    "UPDATE photos SET summary = ? WHERE sha256 = ?", (summary, sha256)
+                )
+
+
+photo_index = PhotoIndex()
+# The indexes ``find_similar`` has opened, by path.
+_indexes = {INDEX_PATH: photo_index}
+
+
+def find_similar(phash: str, path: str = INDEX_PATH) -> str:
+    """``PhotoIndex.find_similar`` on the index at ``path``, as a module-level
+    function that can be handed to a worker process (which opens the index
+    file itself)."""
+    if path not in _indexes:
+        _indexes[path] = PhotoIndex(path)
+    return _indexes[path].find_similar(phash)
+
+
+def _reuse(known: dict, sha256: str) -> dict:
+    fields = {name: known[name] for name in SHARED_FIELDS}
+    fields["photo_hash"] = sha256
+    return fields
+
+
+def _stored_caption_input(index: PhotoIndex, known: dict, sha256: str, upload_dir: str):
+    """The caption input for a duplicate: None once the stored photo has a
+    caption, else its largest JPEG variant within ``CAPTION_LONG_EDGE``."""
+    if index.summary(sha256):
+        return None
+    widths = images.decode_widths(known["variants"])
+    if not widths:
+        return None
+    fitting = [width for width in widths if width <= images.CAPTION_LONG_EDGE]
+    width = max(fitting) if fitting else widths[0]
+    path = os.path.join(upload_dir, images.variant_name(known["filename"], width, "jpg"))
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+async def prepare_photo(data: bytes, basename: str, upload_dir: str, filename: str = "",
+                        index: PhotoIndex = None):
+    """Store an uploaded photo unless it is already stored in ``index``
+    (``photo_index`` by default).
+
+    Returns ``(fields, caption_input, taken)``: the ``Memory`` fields for the
+    photo, the caption input (None for a duplicate whose stored photo is
+    already captioned) and the EXIF date.  A duplicate's ``filename`` is the
+    stored photo's, not ``basename``.
+    """
+    index = index or photo_index
+    sha256 = hashlib.sha256(data).hexdigest()
+    known = index.get(sha256)
+    if known:
+        metrics.incr("photos_exact_duplicate")
+        return (_reuse(known, sha256), _stored_caption_input(index, known, sha256, upload_dir),
+                known["taken"])
+
+    prepared = await run_in_process(
+        images.prepare_upload, data, basename, upload_dir, filename,
+        functools.partial(find_similar, path=index.path),
+    )
+    if "duplicate_of" in prepared:
+        match = prepared["duplicate_of"]
+        known = index.get(match)
+        metrics.incr("photos_near_duplicate")
+        return (_reuse(known, match), _stored_caption_input(index, known, match, upload_dir),
+                prepared["taken"])
+
+    caption_input = prepared.pop("caption_input")
+    taken = prepared.pop("taken")
+    phash = prepared.pop("phash")
+    fields = {"filename": basename, **prepared, "photo_hash": sha256}
+    index.add(sha256, phash, fields, taken)
+    return fields, caption_input, taken
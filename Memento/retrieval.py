@@ -0,0 +1,195 @@
+"""Retrieving memories for a voice turn.
+
+Joining the whole transcript makes every query longer than the last and drags
+retrieval toward whatever was said first.  Each query strategy here caps the
+query at ``QUERY_TOKEN_BUDGET`` tokens, so the embedding input per turn stays
+the same size however long the session runs.
+
+Of the nearest candidates, only those close enough to the query (and to the
+best match) are passed on, optionally reranked by word overlap, with each
+image summary capped, so the prompt carries a few relevant memories rather
+than a fixed ten.
+"""
+
+import os
+import re
+
+from . import metrics, temporal
+from .schema import Memory
+from .tokens import estimate_tokens, truncate_tokens
+
+# "last_turns", "token_budget" or "recency".
+QUERY_STRATEGY = os.environ.get("MEMENTO_QUERY_STRATEGY", "recency")
+QUERY_TURNS = int(os.environ.get("MEMENTO_QUERY_TURNS", "3"))
+QUERY_TOKEN_BUDGET = int(os.environ.get("MEMENTO_QUERY_TOKEN_BUDGET", "96"))
+# Share of the budget the latest utterance may use in the recency strategy.
+LATEST_SHARE = 0.6
+
+
+def last_turns_query(transcript: list[str], budget: int = QUERY_TOKEN_BUDGET,
+                     turns: int = QUERY_TURNS, summary: str = "") -> str:
+    """The last ``turns`` utterances, trimmed from the old end to the budget."""
+    return truncate_tokens(" ".join(transcript[-turns:]), budget, keep_end=True)
+
+
+def token_budget_query(transcript: list[str], budget: int = QUERY_TOKEN_BUDGET,
+                       summary: str = "") -> str:
+    """As many of the most recent utterances as fit in the budget."""
+    parts = []
+    remaining = budget
+    for utterance in reversed(transcript):
+        if remaining <= 0:
+            break
+        piece = truncate_tokens(utterance, remaining, keep_end=True)
+        if piece:
+            parts.append(piece)
+        remaining -= estimate_tokens(piece) + 1
+    return " ".join(reversed(parts))
+
+
+def recency_query(transcript: list[str], budget: int = QUERY_TOKEN_BUDGET,
+                  summary: str = "") -> str:
+    """The latest utterance, then older ones with halving shares of what is
+    left, then the rolling conversation summary if any budget remains."""
+    if not transcript:
+        return truncate_tokens(summary, budget)
+
+    latest = truncate_tokens(transcript[-1], int(budget * LATEST_SHARE))
+    remaining = budget - estimate_tokens(latest)
+    parts = [latest]
+    share = remaining // 2
+    for utterance in reversed(transcript[:-1]):
+        if share <= 0:
+            break
+        piece = truncate_tokens(utterance, share)
+        if piece:
+            parts.append(piece)
+        remaining -= estimate_tokens(piece) + 1
+        share //= 2
+    if summary and remaining > 0:
+        parts.append(truncate_tokens(summary, remaining, keep_end=True))
+    return " ".join(parts)
+
+
+STRATEGIES = {
+    "last_turns": last_turns_query,
+    "token_budget": token_budget_query,
+    "recency": recency_query,
+}
+
+
+def build_query(transcript: list[str], summary: str = "",
+                strategy: str = QUERY_STRATEGY, budget: int = QUERY_TOKEN_BUDGET) -> str:
+    """Return the retrieval query for the current turn."""
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Unknown query strategy {strategy!r}, expected one of {sorted(STRATEGIES)}"
+        )
+    return STRATEGIES[strategy](transcript, budget=budget, summary=summary)
+
+
+# Candidates fetched from the store before thresholding.
+CANDIDATE_K = int(os.environ.get("MEMENTO_CANDIDATE_K", "10"))
+MAX_MEMORIES = int(os.environ.get("MEMENTO_MAX_MEMORIES", "4"))
+# Gemini embeddings are unit length, so Chroma's squared L2 distance is
+# 2 - 2 * cosine similarity: 1.0 means a cosine similarity of 0.5.
+MAX_DISTANCE = float(os.environ.get("MEMENTO_MAX_DISTANCE", "1.0"))
+# Candidates further than this from the best match are dropped.
+DISTANCE_GAP = float(os.environ.get("MEMENTO_DISTANCE_GAP", "0.15"))
+RERANK = os.environ.get("MEMENTO_RERANK", "1") == "1"
+# How much a full word overlap with the query is worth, in distance units.
+RERANK_WEIGHT = float(os.environ.get("MEMENTO_RERANK_WEIGHT", "0.2"))
+SUMMARY_TOKEN_CAP = int(os.environ.get("MEMENTO_SUMMARY_TOKEN_CAP", "150"))
+
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by did do for from had has have he her his i in is it "
+    "me my of on or our she so that the their them there they this to us was we were "
+    "what when where who with you your about remember tell".split()
+)
+
+
+def _words(text: str) -> set[str]:
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def parse_memory(id: str, document: str, metadata: dict, distance: float = 0.0) -> dict:
+    memory = Memory.from_record(id, document, metadata)
+    return {
+        "date": memory.date,
+        "description": memory.description,
+        "summary": memory.summary,
+        "filename": memory.filename,
+        "variants": memory.variants,
+        "distance": distance,
+    }
+
+
+def select_memories(query: str, results: dict, max_memories: int = MAX_MEMORIES) -> list[dict]:
+    """Pick the relevant memories out of a ``collection.query`` result.
+
+    Keeps candidates within ``MAX_DISTANCE`` of the query and ``DISTANCE_GAP``
+    of the best one, reranks them by word overlap with the query, and caps
+    each image summary at ``SUMMARY_TOKEN_CAP`` tokens.  The best candidate is
+    always kept so the model has an image to point at.
+    """
+    ids = results["ids"][0]
+    documents = results["documents"][0]
+    metadatas = results["metadatas"][0]
+    distances = (results.get("distances") or [[0.0] * len(ids)])[0]
+    candidates = [
+        parse_memory(id, doc, metadata, distance)
+        for id, doc, metadata, distance in zip(ids, documents, metadatas, distances)
+    ]
+    if not candidates:
+        return []
+
+    nearest = min(candidates, key=lambda memory: memory["distance"])
+    best = nearest["distance"]
+    selected = [
+        memory for memory in candidates
+        if memory["distance"] <= MAX_DISTANCE and memory["distance"] <= best + DISTANCE_GAP
+    ] or [nearest]
+
+    if RERANK:
+        query_words = _words(query)
+        for memory in selected:
+            overlap = 0.0
+            if query_words:
+                memory_words = _words(f"{memory['description']} {memory['summary']}")
+                overlap = len(query_words & memory_words) / len(query_words)
+            memory["score"] = memory["distance"] - RERANK_WEIGHT * overlap
+        selected.sort(key=lambda memory: memory["score"])
+
+    selected = selected[:max_memories]
+    if nearest not in selected:
+        # The rerank pushed it past the cap; it takes the last slot.
+        selected[-1] = nearest
+    for memory in selected:
+        memory["summary"] = truncate_tokens(memory["summary"], SUMMARY_TOKEN_CAP)
+
+    tokens = sum(
+        estimate_tokens(memory["description"]) + estimate_tokens(memory["summary"])
+        for memory in selected
+    )
+    metrics.observe("memories_per_turn", len(selected))
+    metrics.observe("memory_tokens_per_turn", tokens)
+    print(f"Using {len(selected)} of {len(candidates)} memories (~{tokens} tokens)")
+    return selected
+
+
+def query_memories(collection, query: str, utterance: str, n_results: int = CANDIDATE_K) -> dict:
+    """Nearest-neighbour search, narrowed to the period ``utterance`` mentions.
+
+    When the resident names a time ("in 1972", "last Christmas") the search
+    only considers memories dated in that range.  If nothing is dated there,
+    the unfiltered search runs instead.
+    """
+    where = temporal.where_filter(temporal.extract_date_range(utterance))
+    if where is not None:
+        results = collection.query(query_texts=[query], n_results=n_results, where=where)
+        if results["ids"][0]:
+            metrics.incr("date_filtered_queries")
+            return results
+        print(f"No memories match {where}, searching all memories")
+    return collection.query(query_texts=[query], n_results=n_results)
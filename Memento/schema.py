@@ -0,0 +1,127 @@
+"""The structured memory record stored in the ``vectordb`` collection.
+
+Memories used to be a single ``"date|description|image_summary"`` document
+that every reader had to split (and that broke on descriptions containing a
+``|``).  Each field is now typed metadata: the date as a sortable
+``YYYYMMDD`` integer (so date filters can run inside Chroma) plus its
+display label, the description, the image summary, and the image file, its
+size and the widths of its resized variants.  The document is only the text
+that gets embedded.
+
+Records written before this schema are still readable through
+``Memory.from_record``; ``python -m Memento.migrate`` rewrites them.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+SCHEMA_VERSION = 2
+DATE_FORMAT = "%Y-%m-%d"
+LABEL_FORMAT = "%B %d, %Y"
+
+
+def date_to_int(date_str: str) -> int:
+    """``"1972-07-04"`` -> ``19720704``; 0 if the date can't be parsed."""
+    try:
+        parsed = datetime.strptime(date_str, DATE_FORMAT)
+    except ValueError:
+        return 0
+    return parsed.year * 10000 + parsed.month * 100 + parsed.day
+
+
+def date_label(date_str: str) -> str:
+    try:
+        return datetime.strptime(date_str, DATE_FORMAT).strftime(LABEL_FORMAT)
+    except ValueError:
+        return date_str
+
+
+@dataclass
+class Memory:
+    id: str
+    date: str
+    description: str
+    summary: str = ""
+    # Image base name; the original lives at ``{filename}.jpg``.
+    filename: str = ""
+    image: str = ""
+    thumbnail: str = ""
+    width: int = 0
+    height: int = 0
+    # Widths of the ``images.save_variants`` copies, e.g. "320,800,1600".
+    variants: str = ""
+    # Shared by the memories created from one multi-photo upload.
+    album: str = ""
+    # SHA-256 of the stored photo (``photo_index``); duplicates share it.
+    photo_hash: str = ""
+
+    def document(self) -> str:
+        """The text embedded for retrieval."""
+        return "\n".join(part for part in (self.date, self.description, self.summary) if part)
+
+    def metadata(self) -> dict:
+        # Chroma metadata values must be str, int, float or bool (no None).
+        return {
+            "schema": SCHEMA_VERSION,
+            "date": date_to_int(self.date),
+            "date_iso": self.date,
+            "date_label": date_label(self.date),
+            "description": self.description,
+            "summary": self.summary,
+            "filename": self.filename,
+            "image": self.image,
+            "thumbnail": self.thumbnail,
+            "width": self.width,
+            "height": self.height,
+            "variants": self.variants,
+            "album": self.album,
+            "photo_hash": self.photo_hash,
+        }
+
+    @classmethod
+    def from_metadata(cls, id: str, metadata: dict) -> "Memory":
+        return cls(
+            id=id,
+            date=metadata.get("date_iso", ""),
+            description=metadata.get("description", ""),
+            summary=metadata.get("summary", ""),
+            filename=metadata.get("filename", id),
+            image=metadata.get("image", ""),
+            thumbnail=metadata.get("thumbnail", ""),
+            width=metadata.get("width", 0),
+            height=metadata.get("height", 0),
+            variants=metadata.get("variants", ""),
+            album=metadata.get("album", ""),
+            photo_hash=metadata.get("photo_hash", ""),
+        )
+
+    @classmethod
+    def from_legacy(cls, id: str, document: str, metadata: dict) -> "Memory":
+        """Parse a pre-schema ``"date|description|image_summary"`` record."""
+        date, _, rest = (document or "").partition("|")
+        # The submit handler wrote "date|description|" and the upload handler
+        # appended "|summary", so a captioned record has "||" before the
+        # summary; that split survives a "|" in either field.
+        if "||" in rest:
+            description, summary = rest.split("||", 1)
+        else:
+            description, _, summary = rest.partition("|")
+        filename = (metadata or {}).get("filename", id)
+        return cls(
+            id=id,
+            date=date,
+            description=description,
+            summary=summary,
+            filename=filename,
+            image=f"{filename}.jpg",
+        )
+
+    @classmethod
+    def from_record(cls, id: str, document: str, metadata: dict) -> "Memory":
+        if metadata and metadata.get("schema") == SCHEMA_VERSION:
+            return cls.from_metadata(id, metadata)
+        return cls.from_legacy(id, document, metadata)
+
+
+def is_current(metadata: dict) -> bool:
+    return bool(metadata) and metadata.get("schema") == SCHEMA_VERSION
@@ -0,0 +1,18 @@
+"""The local SQLite files under ``db_path`` (embedding cache, ingest queue,
+photo index) share one way of opening them."""
+
+import os
+import sqlite3
+
+
+def open_sqlite(path: str) -> sqlite3.Connection:
+    """Open ``path``, creating its directory, for use from several threads.
+
+    WAL lets readers carry on while another thread or process writes.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
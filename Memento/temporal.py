@@ -0,0 +1,188 @@
+"""Local extraction of time references from what the resident said.
+
+"When we went to the lake in 1972", "the seventies", "last Christmas" and the
+like become a ``YYYYMMDD`` range.  That range is pushed into the vector search
+as a ``where`` filter on the stored ``date`` metadata, so only memories from
+that period are searched.  Everything is rule based and runs in microseconds.
+"""
+
+import re
+from datetime import date, timedelta
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"),
+        ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+DECADE_WORDS = {
+    "twenties": 20, "thirties": 30, "forties": 40, "fifties": 50,
+    "sixties": 60, "seventies": 70, "eighties": 80, "nineties": 90,
+}
+NUMBER_WORDS = {
+    "a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fifteen": 15, "twenty": 20,
+}
+TENS_WORDS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+UNIT_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9,
+}
+# (start month, start day, end month, end day); winter and New Year wrap
+# around the turn of the year and are handled in _span.
+SEASONS = {
+    "spring": (3, 1, 5, 31),
+    "summer": (6, 1, 8, 31),
+    "fall": (9, 1, 11, 30),
+    "autumn": (9, 1, 11, 30),
+    "winter": (12, 1, 2, 28),
+    "christmas": (12, 15, 12, 31),
+    "thanksgiving": (11, 1, 11, 30),
+    "halloween": (10, 15, 10, 31),
+    "easter": (3, 15, 4, 30),
+    "new year": (12, 28, 1, 7),
+    "new year's": (12, 28, 1, 7),
+}
+
+_YEAR = r"(1[89]\d\d|20\d\d)"
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_SEASON = "|".join(sorted((re.escape(s) for s in SEASONS), key=len, reverse=True))
+
+_MONTH_YEAR = re.compile(rf"\b({_MONTH})\.?(?:\s+of)?,?\s+{_YEAR}\b")
+_SEASON_YEAR = re.compile(rf"\b({_SEASON})(?:\s+of)?,?\s+{_YEAR}\b")
+_RELATIVE_SEASON = re.compile(rf"\b(last|this)\s+({_SEASON})\b")
+_DECADE_DIGITS = re.compile(r"\b(?:(1[89]|20)(\d)0|'?(\d)0)'?s\b")
+_DECADE_WORD = re.compile(rf"\b(?:the\s+)?(early\s+|mid\s+|late\s+)?({'|'.join(DECADE_WORDS)})\b")
+# "twenty five", "thirty-five", "eighty", "a", "40" ... years ago.
+_YEARS_AGO = re.compile(
+    rf"\b(?:({'|'.join(TENS_WORDS)})(?:[\s-]+({'|'.join(UNIT_WORDS)}))?"
+    rf"|(\d+|{'|'.join(NUMBER_WORDS)}))\s+years?\s+ago\b"
+)
+# A bare year only counts after a word that makes it one ("back in 1972",
+# "the summer of 1985"), so "I have 2000 reasons" stays a number.  "to" and
+# "and" close a range whose first year already counted.
+_YEAR_ONLY = re.compile(rf"\b(in|of|during|around|since|from|until|till|circa|year|between)\s+{_YEAR}\b")
+_YEAR_END = re.compile(rf"\b(?:to|and|through)\s+{_YEAR}\b")
+# "my twenties", "in her 80s", "mum's sixties": an age, not a decade.
+_POSSESSIVE = re.compile(r"(?:\b(?:my|our|his|her|their|your)|\w's|s')\s+(?:(?:early|mid|late)\s+)?$")
+
+
+def _int(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def _year_range(start: int, end: int = None) -> tuple[int, int]:
+    return start * 10000 + 101, (end or start) * 10000 + 1231
+
+
+def _month_range(year: int, month: int) -> tuple[int, int]:
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return _int(date(year, month, 1)), _int(following - timedelta(days=1))
+
+
+def _span(year: int, season: str) -> tuple[int, int]:
+    start_month, start_day, end_month, end_day = SEASONS[season]
+    if end_month < start_month:
+        # Crosses the new year: December of ``year`` into the next one.
+        return year * 10000 + start_month * 100 + start_day, \
+            (year + 1) * 10000 + end_month * 100 + end_day
+    return year * 10000 + start_month * 100 + start_day, year * 10000 + end_month * 100 + end_day
+
+
+def _decade_century(decade: int, today: date) -> int:
+    """'the seventies' in 2024 means the 1970s, 'the tens' would be 2010s."""
+    century = today.year // 100 * 100
+    return century + decade if century + decade <= today.year else century - 100 + decade
+
+
+def _search_decade(pattern: re.Pattern, text: str):
+    """The first ``pattern`` match that isn't somebody's age."""
+    for match in pattern.finditer(text):
+        if not _POSSESSIVE.search(text, 0, match.start()):
+            return match
+    return None
+
+
+def extract_date_range(text: str, today: date = None):
+    """Return the ``(start, end)`` YYYYMMDD range ``text`` refers to, or None."""
+    today = today or date.today()
+    text = text.lower()
+
+    match = _MONTH_YEAR.search(text)
+    if match:
+        return _month_range(int(match.group(2)), MONTHS[match.group(1)])
+
+    match = _SEASON_YEAR.search(text)
+    if match:
+        return _span(int(match.group(2)), match.group(1))
+
+    match = _RELATIVE_SEASON.search(text)
+    if match:
+        which, season = match.groups()
+        start, end = _span(today.year, season)
+        if season == "winter" and today.month <= 2:
+            # In January "this winter" began last December.
+            start, end = _span(today.year - 1, season)
+        if which == "last" and end >= _int(today):
+            start, end = _span(start // 10000 - 1, season)
+        return start, end
+
+    if re.search(r"\blast year\b", text):
+        return _year_range(today.year - 1)
+    if re.search(r"\bthis year\b", text):
+        return _year_range(today.year)
+    if re.search(r"\blast month\b", text):
+        last_month = today.replace(day=1) - timedelta(days=1)
+        return _month_range(last_month.year, last_month.month)
+
+    match = _YEARS_AGO.search(text)
+    if match:
+        tens, units, amount = match.groups()
+        if tens:
+            years = TENS_WORDS[tens] + UNIT_WORDS.get(units, 0)
+        else:
+            years = int(amount) if amount.isdigit() else NUMBER_WORDS[amount]
+        # "Forty years ago" is approximate; allow a year either side.
+        return _year_range(today.year - years - 1, today.year - years + 1)
+
+    match = _search_decade(_DECADE_DIGITS, text)
+    if match:
+        if match.group(1):
+            start = int(match.group(1)) * 100 + int(match.group(2)) * 10
+        else:
+            start = _decade_century(int(match.group(3)) * 10, today)
+        return _year_range(start, start + 9)
+
+    match = _search_decade(_DECADE_WORD, text)
+    if match:
+        start = _decade_century(DECADE_WORDS[match.group(2)], today)
+        part = (match.group(1) or "").strip()
+        if part == "early":
+            return _year_range(start, start + 3)
+        if part == "mid":
+            return _year_range(start + 3, start + 6)
+        if part == "late":
+            return _year_range(start + 6, start + 9)
+        return _year_range(start, start + 9)
+
+    years = [int(year) for _, year in _YEAR_ONLY.findall(text)]
+    if years:
+        years += [int(year) for year in _YEAR_END.findall(text)]
+        return _year_range(min(years), max(years))
+    return None
+
+
+def where_filter(date_range):
+    """A Chroma ``where`` clause restricting ``date`` to ``date_range``."""
+    if date_range is None:
+        return None
+    start, end = date_range
+    return {"$and": [{"date": {"$gte": start}}, {"date": {"$lte": end}}]}
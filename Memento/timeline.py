@@ -0,0 +1,251 @@
+"""Cursor-based pages of the family timeline, newest first.
+
+Chroma can't sort, so a page is assembled from date windows walking back in
+time: each window is a ``where`` filter on the integer ``date`` metadata that
+fetches metadata only.  Windows start a month wide and double until the page
+is full, so sparse and dense collections both need only a few queries.  The
+cursor records where the last page stopped, how wide the last window was and
+how many rows have been served, so the next page starts at the right density.
+
+Chroma's SQLite planner answers a one-sided ``$gte`` through its metadata
+index but scans for a two-sided range, so near the top of the timeline the
+window is fetched as "everything since ``lower``" and clipped here; that
+keeps the first page flat as the collection grows.  Deeper down, where that
+would re-read many served rows, the window is a bounded range.
+
+Pages are normally served from a ``TimelineIndex``: every memory's timeline
+row, materialized once per collection and kept sorted.  The family pages
+update it as they write, and it is rebuilt when the store's record count no
+longer matches (something outside the app wrote to it) or it gets older than
+``MAX_AGE``.  While an index is being built, pages fall back to the window
+scan above; both produce the same cursors, so a scroll can cross over.
+
+Only records in the structured schema carry a ``date``, so the window scan
+skips older ones; the index parses them.  ``python -m Memento.migrate``
+upgrades them for good.
+"""
+
+import bisect
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from . import images
+from .schema import Memory, is_current
+
+PAGE_SIZE = int(os.environ.get("MEMENTO_TIMELINE_PAGE_SIZE", "20"))
+INITIAL_WINDOW_DAYS = 31
+# Use one-sided windows while at most this many newer rows would be re-read.
+ONE_SIDED_ROWS = int(os.environ.get("MEMENTO_TIMELINE_ONE_SIDED_ROWS", "2000"))
+# Undated (date 0) and very old records are swept up by the last window.
+EARLIEST_DATE = date(1800, 1, 1)
+LATEST_DATE = 99991231
+# Seconds before a timeline index is rebuilt even if nothing seems to change.
+MAX_AGE = float(os.environ.get("MEMENTO_TIMELINE_MAX_AGE", "600"))
+
+
+def _to_date(value: int) -> date:
+    try:
+        return date(value // 10000, value // 100 % 100, value % 100)
+    except ValueError:
+        return EARLIEST_DATE
+
+
+def _to_int(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def encode_cursor(date_int: int, id: str, window_days: int, served: int) -> str:
+    return f"{date_int}:{window_days}:{served}:{id}"
+
+
+def decode_cursor(cursor: str):
+    date_int, window_days, served, id = cursor.split(":", 3)
+    return int(date_int), int(window_days), int(served), id
+
+
+def to_row(id: str, metadata: dict) -> dict:
+    """The fields one timeline entry needs."""
+    original = metadata["image"] or f"{metadata['filename']}.jpg"
+    basename = original.removesuffix(".jpg")
+    variants = metadata.get("variants", "")
+    return {
+        "id": id,
+        "date": metadata["date_label"],
+        "description": metadata["description"],
+        "image_filename": images.fallback_src(basename, variants, original),
+        "srcset_webp": images.srcset(basename, variants, "webp"),
+        "srcset_jpeg": images.srcset(basename, variants, "jpg"),
+        "width": str(metadata.get("width") or ""),
+        "height": str(metadata.get("height") or ""),
+    }
+
+
+def scan_page(collection, cursor: str = "", page_size: int = PAGE_SIZE,
+              today: date = None) -> tuple[list[dict], str]:
+    """Return the next ``page_size`` timeline rows after ``cursor``, read
+    straight from Chroma, and the cursor for the page after that ("" once the
+    timeline is exhausted)."""
+    today = today or date.today()
+    if cursor:
+        after_date, window_days, served, after_id = decode_cursor(cursor)
+        upper = after_date
+        anchor = min(_to_date(upper), today)
+    else:
+        after_date, window_days, served, after_id = LATEST_DATE, INITIAL_WINDOW_DAYS, 0, None
+        upper = LATEST_DATE
+        anchor = today
+
+    found = []
+    exhausted = False
+    while len(found) < page_size and not exhausted:
+        lower_day = anchor - timedelta(days=window_days)
+        if lower_day <= EARLIEST_DATE:
+            lower, exhausted = 0, True
+        else:
+            lower = _to_int(lower_day)
+
+        if served + len(found) < ONE_SIDED_ROWS:
+            where = {"date": {"$gte": lower}}
+        else:
+            where = {"$and": [{"date": {"$gte": lower}}, {"date": {"$lte": upper}}]}
+        batch = collection.get(where=where, include=["metadatas"])
+        for id, metadata in zip(batch["ids"], batch["metadatas"]):
+            key = (metadata["date"], id)
+            if key[0] > upper:
+                continue
+            if after_id is None or key < (after_date, after_id):
+                found.append((key, id, metadata))
+
+        anchor = lower_day - timedelta(days=1)
+        upper = _to_int(anchor)
+        if len(found) < page_size:
+            window_days *= 2
+
+    # Everything in later windows is older, so the newest page_size are final.
+    found.sort(key=lambda item: item[0], reverse=True)
+    page = found[:page_size]
+    rows = [to_row(id, metadata) for _, id, metadata in page]
+
+    if not page or (exhausted and len(found) <= page_size):
+        return rows, ""
+    (last_date, last_id), _, _ = page[-1]
+    return rows, encode_cursor(last_date, last_id, max(INITIAL_WINDOW_DAYS, window_days // 2),
+                               served + len(page))
+
+
+class TimelineIndex:
+    """Every memory's timeline row for one collection, sorted by date."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (date, id) ascending; pages are read from the end.
+        self._keys = []
+        self._rows = {}
+        self._dates = {}
+        self._built_at = 0.0
+        self._building = False
+        # Writes that land while a build is reading the store.
+        self._pending = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._built_at > 0
+
+    def is_fresh(self, collection) -> bool:
+        if time.monotonic() - self._built_at > MAX_AGE:
+            return False
+        return collection.count() == len(self._keys)
+
+    def build(self, collection) -> None:
+        """Read every record's metadata and replace the index contents."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._pending = {}
+        try:
+            results = collection.get(include=["metadatas"])
+            entries = dict(zip(results["ids"], results["metadatas"]))
+            legacy_ids = [id for id, metadata in entries.items() if not is_current(metadata)]
+            if legacy_ids:
+                print(f"{len(legacy_ids)} memories use the old format; run python -m Memento.migrate")
+                old = collection.get(ids=legacy_ids, include=["documents", "metadatas"])
+                for id, doc, metadata in zip(old["ids"], old["documents"], old["metadatas"]):
+                    entries[id] = Memory.from_legacy(id, doc, metadata).metadata()
+        except Exception:
+            with self._lock:
+                self._building = False
+            raise
+
+        with self._lock:
+            entries.update(self._pending)
+            self._dates = {id: metadata["date"] for id, metadata in entries.items()}
+            self._rows = {id: to_row(id, metadata) for id, metadata in entries.items()}
+            self._keys = sorted((date_int, id) for id, date_int in self._dates.items())
+            self._built_at = time.monotonic()
+            self._building = False
+            self._pending = {}
+
+    def build_in_background(self, collection) -> None:
+        if not self._building:
+            threading.Thread(target=self.build, args=(collection,), daemon=True).start()
+
+    def upsert(self, id: str, metadata: dict) -> None:
+        """Add or move one memory after the app wrote it."""
+        with self._lock:
+            if self._building:
+                self._pending[id] = metadata
+            if not self.ready:
+                return
+            if id in self._dates:
+                del self._keys[bisect.bisect_left(self._keys, (self._dates[id], id))]
+            self._dates[id] = metadata["date"]
+            self._rows[id] = to_row(id, metadata)
+            bisect.insort(self._keys, (metadata["date"], id))
+
+    def page(self, cursor: str = "", page_size: int = PAGE_SIZE) -> tuple[list[dict], str]:
+        with self._lock:
+            if cursor:
+                after_date, window_days, served, after_id = decode_cursor(cursor)
+                end = bisect.bisect_left(self._keys, (after_date, after_id))
+            else:
+                window_days, served = INITIAL_WINDOW_DAYS, 0
+                end = len(self._keys)
+            start = max(0, end - page_size)
+            keys = self._keys[start:end][::-1]
+            rows = [self._rows[id] for _, id in keys]
+        if start == 0:
+            return rows, ""
+        last_date, last_id = keys[-1]
+        return rows, encode_cursor(last_date, last_id, window_days, served + len(rows))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(collection) -> TimelineIndex:
+    with _indexes_lock:
+        return _indexes.setdefault(str(collection.id), TimelineIndex())
+
+
+def record(collection, memory: Memory) -> None:
+    """Keep the collection's timeline index in step with a write."""
+    get_index(collection).upsert(memory.id, memory.metadata())
+
+
+def fetch_page(collection, cursor: str = "", page_size: int = PAGE_SIZE) -> tuple[list[dict], str]:
+    """Return the next ``page_size`` timeline rows after ``cursor`` and the
+    cursor for the page after that ("" once the timeline is exhausted).
+
+    Served from the collection's index when it is built and current (checked
+    when a scroll starts); otherwise the index is rebuilt in the background
+    and this page is scanned from Chroma.
+    """
+    index = get_index(collection)
+    if index.ready and (cursor or index.is_fresh(collection)):
+        return index.page(cursor, page_size)
+    index.build_in_background(collection)
+    return scan_page(collection, cursor, page_size)
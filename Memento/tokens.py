@@ -0,0 +1,30 @@
+"""Cheap, local token estimates for budgeting prompts and queries.
+
+Gemini's tokenizer averages roughly four characters of English per token;
+that is close enough for budgets and avoids a round trip to count_tokens.
+"""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """Cut ``text`` to about ``max_tokens``, on a word boundary.
+
+    Keeps the beginning of the text, or the end if ``keep_end`` is set.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    if keep_end:
+        cut = text[-limit:]
+        space = cut.find(" ")
+        return cut[space + 1:] if 0 <= space < len(cut) - 1 else cut
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    return cut[:space] if space > 0 else cut
@@ -0,0 +1,256 @@
+"""Sentence-pipelined text to speech.
+
+Instead of synthesizing the whole reply once it is complete, the reply is cut
+at sentence boundaries while it streams in.  Sentences are synthesized
+concurrently and handed back in order, so the first one can start playing
+while later ones are still being generated.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+
+from deepgram import (
+    DeepgramClient,
+    SpeakOptions,
+)
+
+from . import metrics
+from .executor import run_blocking
+
+deepgram = DeepgramClient(os.environ['DEEPGRAM_API_KEY'])
+
+VOICE_MODEL = "aura-asteria-en"
+ENCODING = "linear16"
+CONTAINER = "wav"
+
+# Sentences synthesized at the same time for one reply.
+TTS_CONCURRENCY = int(os.environ.get("MEMENTO_TTS_CONCURRENCY", "3"))
+# Short sentences ("Oh!") are merged with the next one to avoid tiny clips.
+MIN_SENTENCE_CHARS = int(os.environ.get("MEMENTO_TTS_MIN_SENTENCE_CHARS", "40"))
+
+# Synthesized clips are kept under the upload directory so they can be served,
+# named after a hash of (text, voice model, encoding, container).
+UPLOAD_DIR = os.environ.get("REFLEX_UPLOADED_FILES_DIR", "uploaded_files")
+TTS_CACHE_SUBDIR = "tts"
+TTS_CACHE_MAX_BYTES = int(os.environ.get("MEMENTO_TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Clips used more recently than this are never evicted; they may be playing.
+TTS_CACHE_MIN_AGE = float(os.environ.get("MEMENTO_TTS_CACHE_MIN_AGE", "600"))
+TTS_CACHE_EVICT_INTERVAL = float(os.environ.get("MEMENTO_TTS_CACHE_EVICT_INTERVAL", "300"))
+
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+class SentenceSplitter:
+    """Incrementally cuts streamed text into sentences."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add streamed ``text``; return the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list[str]:
+        """Return whatever is left once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class SpeechCache:
+    """Content-addressed clip store with an LRU size cap.
+
+    File modification times double as last-used timestamps: a cache hit
+    touches the file, eviction removes the stalest files first.
+    """
+
+    def __init__(self, upload_dir: str = UPLOAD_DIR, subdir: str = TTS_CACHE_SUBDIR,
+                 max_bytes: int = TTS_CACHE_MAX_BYTES, min_age: float = TTS_CACHE_MIN_AGE):
+        self.upload_dir = upload_dir
+        self.subdir = subdir
+        self.directory = os.path.join(upload_dir, subdir)
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+        self._lock = threading.Lock()
+        self._evictor = None
+
+    @staticmethod
+    def key(text: str) -> str:
+        material = "\0".join([VOICE_MODEL, ENCODING, CONTAINER, text])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def filename(self, key: str) -> str:
+        """The clip's path relative to the upload directory."""
+        return f"{self.subdir}/{key}.{CONTAINER}"
+
+    def lookup(self, key: str):
+        """Return the clip's upload-relative filename, or None on a miss."""
+        path = os.path.join(self.upload_dir, self.filename(key))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            metrics.incr("tts_cache_misses")
+            return None
+        self.hits += 1
+        metrics.incr("tts_cache_hits")
+        return self.filename(key)
+
+    def temp_path(self, key: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".{key}.{threading.get_ident()}.tmp")
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """Atomically move a freshly synthesized clip into place."""
+        os.replace(temp_path, os.path.join(self.upload_dir, self.filename(key)))
+        return self.filename(key)
+
+    def evict(self) -> int:
+        """Delete the least recently used clips until under ``max_bytes``."""
+        with self._lock:
+            try:
+                entries = [
+                    entry for entry in os.scandir(self.directory)
+                    if entry.is_file() and not entry.name.startswith(".")
+                ]
+            except FileNotFoundError:
+                return 0
+            files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+            total = sum(size for _, size, _ in files)
+            if total <= self.max_bytes:
+                return 0
+
+            freed = 0
+            cutoff = time.time() - self.min_age
+            target = total - int(self.max_bytes * 0.9)
+            for mtime, size, path in sorted(files):
+                if freed >= target or mtime > cutoff:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                freed += size
+            self.evicted_bytes += freed
+            metrics.incr("tts_cache_evicted_bytes", freed)
+            return freed
+
+    def start_evictor(self, interval: float = TTS_CACHE_EVICT_INTERVAL) -> None:
+        """Start the background eviction thread if it isn't running yet."""
+        with self._lock:
+            if self._evictor is not None:
+                return
+            self._evictor = threading.Thread(
+                target=self._evict_forever, args=(interval,),
+                name="tts-cache-evictor", daemon=True,
+            )
+        self._evictor.start()
+
+    def _evict_forever(self, interval: float) -> None:
+        while True:
+            try:
+                self.evict()
+            except OSError as e:
+                print(f"TTS cache eviction failed: {e}")
+            time.sleep(interval)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+speech_cache = SpeechCache()
+
+
+def synthesize_speech(text: str) -> str:
+    """Return the upload-relative filename of a clip saying ``text``,
+    synthesizing it only if it isn't cached yet (blocking)."""
+    speech_cache.start_evictor()
+    text = text.strip()
+    key = speech_cache.key(text)
+    cached = speech_cache.lookup(key)
+    if cached:
+        return cached
+
+    SPEAK_OPTIONS = {"text": text}
+    options = SpeakOptions(
+        model=VOICE_MODEL,
+        encoding=ENCODING,
+        container=CONTAINER
+    )
+
+    temp_path = speech_cache.temp_path(key)
+    try:
+        deepgram.speak.v("1").save(temp_path, SPEAK_OPTIONS, options)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return speech_cache.commit(key, temp_path)
+
+
+class SpeechPipeline:
+    """Synthesizes sentences concurrently and returns the clips in order.
+
+    A sentence whose synthesis fails is logged and skipped; the rest of the
+    reply is still spoken.
+    """
+
+    def __init__(self, concurrency: int = TTS_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = []
+        self._next = 0
+
+    async def _synthesize(self, sentence: str) -> str:
+        async with self._semaphore:
+            try:
+                return await run_blocking(synthesize_speech, sentence)
+            except Exception as e:
+                metrics.incr("tts_failures")
+                print(f"Speech synthesis failed, skipping sentence: {e}")
+                return ""
+
+    def add(self, sentence: str) -> None:
+        self._tasks.append(asyncio.create_task(self._synthesize(sentence)))
+
+    def ready(self) -> list[str]:
+        """Return the clips that are done, stopping at the first pending one."""
+        clips = []
+        while self._next < len(self._tasks) and self._tasks[self._next].done():
+            clip = self._tasks[self._next].result()
+            self._next += 1
+            if clip:
+                clips.append(clip)
+        return clips
+
+    async def drain(self):
+        """Yield the remaining clips in order as each one finishes."""
+        while self._next < len(self._tasks):
+            clip = await self._tasks[self._next]
+            self._next += 1
+            if clip:
+                yield clip
+
+    def cancel(self) -> None:
+        for task in self._tasks[self._next:]:
+            task.cancel()
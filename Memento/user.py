@@ -1,30 +1,36 @@
-from urllib.request import urlopen
-
 import reflex as rx
 
-from reflex_audio_capture import AudioRecorderPolyfill, get_codec, strip_codec_part
+from reflex_audio_capture import AudioRecorderPolyfill
 
 import os
-from groq import Groq
-from deepgram import (
-    DeepgramClient,
-    SpeakOptions,
-)
+from groq import AsyncGroq
 
-import chromadb
-
-from chromadb import Documents, EmbeddingFunction, Embeddings
 import google.generativeai as genai
-import re
+import time
 
+from . import assistant, audio, history, images, memory_store, metrics, retrieval, tts
+from .executor import run_blocking
 from .components import *
 
-client = Groq(api_key=os.environ['GROQ_API_KEY'])
-deepgram = DeepgramClient(os.environ['DEEPGRAM_API_KEY'])
+client = AsyncGroq(api_key=os.environ['GROQ_API_KEY'])
 genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
 
 REF = "myaudio"
 
+# Stream the reply into text_output as it is generated, pushing at most one
+# state update per STREAM_YIELD_INTERVAL seconds.
+STREAM_RESPONSES = os.environ.get("MEMENTO_STREAM_RESPONSES", "1") != "0"
+STREAM_YIELD_INTERVAL = float(os.environ.get("MEMENTO_STREAM_YIELD_INTERVAL", "0.15"))
+
+
+async def response_chunks(response):
+    """Iterate a Gemini reply chunk by chunk, streamed or not."""
+    if STREAM_RESPONSES:
+        async for chunk in response:
+            yield chunk
+    else:
+        yield response
+
 # Add the create_themed_page function
 def create_custom_heading(heading_type, font_size, margin_bottom, heading_text):
     return rx.heading(
@@ -46,14 +52,6 @@ def create_themed_page(content):
         font_family='system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, "Noto Sans", sans-serif',
         width="100%"
     )
-class GeminiEmbeddingFunction(EmbeddingFunction):
-    def __call__(self, input: Documents) -> Embeddings:
-        model = 'models/embedding-001'
-        title = "Custom query"
-        return genai.embed_content(model=model,
-                                   content=input,
-                                   task_type="retrieval_document",
-                                   title=title)["embedding"]
 
 
 class UserState(rx.State):
@@ -64,33 +62,77 @@ class UserState(rx.State):
     transcript: list[str] = []
     device_id: str = ""
     use_mp3: bool = True
-    tts_output_file: str = ""
     is_talking: bool = False
 
     img_to_display: str = ""
+    img_srcset_webp: str = ""
+    img_srcset_jpeg: str = ""
     text_output: str = ""
-    filenum: int = 0
 
-    history: list[tuple[str, str]] = []
+    # Synthesized sentences of the current reply, played back in order.
+    tts_queue: list[str] = []
+    tts_index: int = 0
+    tts_done: bool = True
+
+    # Conversation history stays on the backend: recent exchanges verbatim,
+    # older ones folded into a rolling summary.
+    _history: list[tuple[str, str]] = []
+    _history_summary: str = ""
+
+    # Bumped on every turn so a superseded turn stops touching the state.
+    _turn_id: int = 0
 
     def get_data(self):
+        # A turn still streaming into the old page must not write into this one.
+        self._turn_id += 1
         self.transcript = []
         self.text_output = ""
+        self._clear_image()
+        self._history = []
+        self._history_summary = ""
+        self._reset_speech()
+
+    def _clear_image(self):
         self.img_to_display = ""
-        self.history = []
+        self.img_srcset_webp = ""
+        self.img_srcset_jpeg = ""
+
+    def _reset_speech(self):
+        self.tts_queue = []
+        self.tts_index = 0
+        self.tts_done = True
+        self.is_talking = False
 
+    @rx.var
+    def current_tts(self) -> str:
+        if self.tts_index < len(self.tts_queue):
+            return self.tts_queue[self.tts_index]
+        return ""
+
+    @rx.background
     async def on_data_available(self, chunk: str):
-        mime_type, _, codec = get_codec(chunk).partition(";")
-        audio_type = mime_type.partition("/")[2]
-        if audio_type == "mpeg":
-            audio_type = "mp3"
-        with urlopen(strip_codec_part(chunk)) as audio_data:
+        turn_start = time.perf_counter()
+        # Decode the data URL into a pooled buffer, drop chunks without speech
+        # and trim silence before uploading
+        with audio.decode_data_url(chunk) as decoded:
+            recorded_bytes = len(decoded.data)
+            vad = await run_blocking(audio.trim_silence, decoded.data, decoded.audio_type)
+            metrics.incr("vad_bytes_saved", recorded_bytes - len(vad.audio))
+            if not vad.has_speech:
+                metrics.incr("turns_skipped")
+                print("No speech detected, skipping turn")
+                return
+
             try:
-                self.processing = True
-                yield
-                transcription = client.audio.transcriptions.create(
+                async with self:
+                    self.processing = True
+                transcription = await client.audio.transcriptions.create(
                     # Required audio file
-                    file=(("temp." + audio_type, audio_data.read(), mime_type)),
+                    file=(
+                        "temp." + decoded.audio_type,
+                        audio.BufferReader(vad.audio),
+                        decoded.mime_type,
+                    ),
                     model="whisper-large-v3-turbo",  # Required model to use for transcription
                     prompt="Specify context or spelling",  # Optional
                     response_format="json",  # Optional
@@ -98,130 +140,133 @@ class UserState(rx.State):
                     temperature=0.0  # Optional
                 )
             except Exception as e:
-                self.has_error = True
+                async with self:
+                    self.has_error = True
+                    self.processing = False
                 yield capture.stop()
                 raise
-            finally:
+
+        if not transcription.text.strip():
+            async with self:
                 self.processing = False
-            self.transcript.append(transcription.text)
+            metrics.incr("turns_skipped")
+            print("Empty transcript, skipping turn")
+            return
 
-        # Get Documents
-        collection = chromadb.HttpClient(host='localhost', port=8001).get_or_create_collection(
-            name="vectordb", embedding_function=GeminiEmbeddingFunction())
-        results = collection.query(
-            query_texts=[" ".join(self.transcript)],
-            n_results=10,
-        )
-        print(results)
-
-        # Prompt LLM
-        documents = results["documents"][0]
-        metadatas = results["metadatas"][0]
-
-        output = ""
-        # Iterate through the
-        for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
-            # Split the document into date and description
-            date, description, image_summary = doc.split('|', 2)
-            filename = metadata["filename"]
-
-            # Add the formatted data to the result string
-            output += f"""
-            <memory{i}>
-            Date: {date}
-            Description: {description}
-            ImageName: {filename}
-            Image Summary: {image_summary}
-            </memory{i}>
-            """
-        output = output.strip()
-
-        system = f"""
-        You are Memento, a memory storage AI designed for elderly individuals in nursing homes.
-        Your role is to help elderly users recall cherished memories by using voice recognition technology. 
-        When an elderly user speaks about a memory, you retrieve and display relevant images that are stored in the system.
-        When an elderly user speaks about a memory, you don't just passively listen, you actively engage with their narrative. 
-        You retrieve and display relevant images, creating a rich, multi-sensory experience that brings their memories to life. 
-        Your responses should be carefully crafted based on the specific memory data provided, ensuring a personalized and accurate reflection of each individual's unique life experiences.
-        You must always use the `fileNameGrabber` tool call.
-
-        **Your responses should be based on the data provided about the memories**
-
-        # Persona
-        <persona>
-        - Be Empathetic and Warm
-        - Have a Clear Communication
-        - Be Nostalgic and Personalized
-        - Be Patient and Non-Rushed
-        - Keep Your Tone Gentle, Slow-Paced, Comforting
-        </persona>
-
-        # Interaction Guidelines
-        <guidelines>
-        - Always greet the user with a warm welcome.
-        - When a memory is mentioned, respond with excitement and genuine interest.
-        - Do NOT mention the Image Summary directly, understand the Image Summary paired with the Description to understand the context.
-        - Your response should contain about one paragraph long, try to elaborate things mentioned in the Description and Image Summary.
-        - If a memory seems emotional, acknowledge the user's feelings with empathy.
-        - Ask gentle follow-up questions to encourage more storytelling.
-        - End each interaction on a positive note.
-        </guidelines>
-
-        # Memories Data
-        <data>
-        {output}
-        </data>
-        """
-
-        def fileNameGrabber(image_name: str) -> str:
-            """Grabs the Image Name of the most relevant memory created in your response.
-
-            Args:
-                image_name: Light level from 0 to 100. Zero is off and 100 is full brightness
-
-            Returns:
-                A string containing the image_name of the most relevant memory in your response.
-            """
-            return image_name
-
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            system_instruction=system,
-            tools=[fileNameGrabber]
-        )
+        async with self:
+            self.processing = False
+            self.transcript.append(transcription.text)
+            self._turn_id += 1
+            turn_id = self._turn_id
+            query = retrieval.build_query(self.transcript, summary=self._history_summary)
+            user_text = self.transcript[-1]
+            chat_history = history.to_gemini_history(self._history, self._history_summary)
+
+            # Reset
+            self.text_output = ""
+            self._clear_image()
+            self._reset_speech()
+            self.tts_done = False
+
+        text_output = ""
+        image_name = ""
+        splitter = tts.SentenceSplitter()
+        speech = tts.SpeechPipeline()
+        last_yield = time.monotonic()
+        try:
+            # Get Documents
+            results = await run_blocking(
+                memory_store.run,
+                lambda collection: retrieval.query_memories(collection, query, user_text),
+            )
+            memories = retrieval.select_memories(query, results)
+
+            # Prompt LLM with the memories as per-turn context
+            turn_message = assistant.build_turn_message(
+                assistant.format_memories(memories), user_text
+            )
+
+            # Run LLM
+            chat = assistant.get_model().start_chat(
+                history=chat_history
+            )
+            response = await chat.send_message_async(
+                turn_message, stream=STREAM_RESPONSES
+            )
+
+            # Get Text, and the image tool call which arrives with the last chunks.
+            # Finished sentences go to speech synthesis while the rest streams in.
+            async for response_chunk in response_chunks(response):
+                if not response_chunk.candidates:
+                    continue
+                for part in response_chunk.candidates[-1].content.parts:
+                    if part.text:
+                        if not text_output:
+                            ttfw = time.perf_counter() - turn_start
+                            metrics.observe("time_to_first_word", ttfw)
+                            print(f"Time to first word: {ttfw:.2f}s")
+                        text_output += part.text
+                        for sentence in splitter.feed(part.text):
+                            speech.add(sentence)
+                    elif part.function_call.name == "fileNameGrabber":
+                        image_name = part.function_call.args.get("image_name", "")
+                if time.monotonic() - last_yield >= STREAM_YIELD_INTERVAL:
+                    last_yield = time.monotonic()
+                    async with self:
+                        if self._turn_id != turn_id:
+                            return
+                        self.text_output = text_output
+                        self._queue_speech(speech.ready())
+            for sentence in splitter.flush():
+                speech.add(sentence)
+            print(text_output)
+
+            async with self:
+                if self._turn_id != turn_id:
+                    return
+                self.text_output = text_output
+
+                # Save history
+                self._history, self._history_summary = history.add_exchange(
+                    self._history, self._history_summary, user_text, text_output
+                )
 
-        # Get History
-        history = []
-        for item in self.history:
-            history.append({"role": "user", "parts": item[0]})
-            history.append({"role": "model", "parts": item[1]})
-
-        # Reset
-        self.text_output = ""
-        self.img_to_display = ""
-        
-        # Run LLM
-        chat = model.start_chat(
-            history=history
-        ) 
-        response = chat.send_message(self.transcript[-1])
-
-        # Get Text
-        self.text_output = response.candidates[-1].content.parts[0].text
-        self.is_talking = True
-        print(self.text_output)
-
-        # Save history
-        self.history.append((self.transcript[-1], self.text_output))
-
-        # Get image tool call
-        if len(response.candidates[-1].content.parts) > 1:
-            text = response.candidates[-1].content.parts[1].function_call.__str__()
-            pattern = r'string_value:\s*"([a-f0-9-]+)"'
-            self.img_to_display = f"{re.search(pattern, text).group(1)}.jpg"
-            print("Image Name:", self.img_to_display)
-        else:
-            self.img_to_display = ""
+                if image_name:
+                    basename = image_name.removesuffix('.jpg')
+                    variants = next(
+                        (memory["variants"] for memory in memories if memory["filename"] == basename), ""
+                    )
+                    self.img_to_display = images.fallback_src(basename, variants, f"{basename}.jpg")
+                    self.img_srcset_webp = images.srcset(basename, variants, "webp")
+                    self.img_srcset_jpeg = images.srcset(basename, variants, "jpg")
+                    print("Image Name:", self.img_to_display)
+                else:
+                    self._clear_image()
+                self._queue_speech(speech.ready())
+
+            async for clip in speech.drain():
+                async with self:
+                    if self._turn_id != turn_id:
+                        return
+                    self._queue_speech([clip])
+        except Exception:
+            async with self:
+                if self._turn_id == turn_id:
+                    self.has_error = True
+                    self.processing = False
+            raise
+        finally:
+            speech.cancel()
+            async with self:
+                if self._turn_id == turn_id:
+                    self.tts_done = True
+                    if self.tts_index >= len(self.tts_queue):
+                        self.is_talking = False
+
+    def _queue_speech(self, clips: list[str]):
+        if clips:
+            self.tts_queue = self.tts_queue + clips
+            self.is_talking = True
 
     def set_device_id(self, value):
         self.device_id = value
@@ -234,28 +279,11 @@ class UserState(rx.State):
         # We can start the recording immediately when the page loads
         return capture.start()
 
-    def reset_output(self):
-        # self.text_output = ""
-        # self.img_to_display = ""
-        self.filenum += 1
-        self.is_talking = False
-
-    @rx.var(cache=True)
-    def get_tts(self) -> str:
-        if not self.text_output:
-            return ""
-
-        print("LLM Output: " + self.text_output)
-        SPEAK_OPTIONS = {"text": self.text_output}
-        self.tts_output_file = f"tts_output_{self.filenum}.wav"
-        options = SpeakOptions(
-            model="aura-asteria-en",
-            encoding="linear16",
-            container="wav"
-        )
-
-        deepgram.speak.v("1").save(f"uploaded_files/{self.tts_output_file}", SPEAK_OPTIONS, options)
-        return self.tts_output_file
+    def advance_tts(self):
+        """Move on to the next sentence once the current clip has ended."""
+        self.tts_index += 1
+        if self.tts_index >= len(self.tts_queue) and self.tts_done:
+            self.is_talking = False
 
 
 capture = AudioRecorderPolyfill.create(
@@ -343,21 +371,26 @@ def user_index() -> rx.Component:
                 ),
                 rx.cond(
                     UserState.img_to_display != "",
-                    rx.image(
-                        src=rx.get_upload_url(UserState.img_to_display), 
-                        width="100%", 
-                        height="auto",
-                        border_radius="10px"
+                    create_responsive_image(
+                        src=UserState.img_to_display,
+                        srcset_webp=UserState.img_srcset_webp,
+                        srcset_jpeg=UserState.img_srcset_jpeg,
+                        sizes=images.DISPLAY_SIZES,
+                        style={
+                            "width": "100%",
+                            "height": "auto",
+                            "border_radius": "10px",
+                        },
                     ),
                 ),
                 rx.cond(
-                    UserState.is_talking,
+                    UserState.is_talking & (UserState.current_tts != ""),
                     rx.audio(
-                        url=rx.get_upload_url(UserState.get_tts),
+                        url=rx.get_upload_url(UserState.current_tts),
                         width="0px",
                         height="0px",
                         playing=True,
-                        on_ended=UserState.reset_output
+                        on_ended=UserState.advance_tts
                     ),
                 ),
                 rx.cond(
@@ -0,0 +1,126 @@
+"""Memory store latency: Chroma server over HTTP vs. embedded in-process.
+
+Stores the same ``SIZE`` synthetic memories (768-dimensional random vectors,
+like Gemini's) in a Chroma server started on a temporary directory and in a
+``PersistentClient`` on another one — the two ``memory_store.CHROMA_MODE``
+settings — and times the calls the app makes: a nearest-neighbour query (the
+retrieval path, minus the query embedding), fetching one memory by id (the
+user page) and a timeline page.  The server is started the way ``chroma run``
+starts it.
+
+    python -m benchmarks.chroma_modes
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from Memento.schema import Memory
+
+SIZE = 10_000
+DIMENSIONS = 768
+BATCH = 1000
+REPEATS = 200
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(path: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, IS_PERSISTENT="True", PERSIST_DIRECTORY=path,
+               ANONYMIZED_TELEMETRY="False")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "chromadb.app:app",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(300):
+        try:
+            # The client checks the server is up as soon as it is created.
+            chromadb.HttpClient(host="localhost", port=port).heartbeat()
+            return server
+        except Exception:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Chroma server didn't start")
+
+
+def fill(collection, vectors: np.ndarray) -> None:
+    for start in range(0, len(vectors), BATCH):
+        memories = [
+            Memory(id=f"m{i}", date=f"{1940 + i % 85}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                   description=f"Synthetic memory number {i}")
+            for i in range(start, min(start + BATCH, len(vectors)))
+        ]
+        collection.add(
+            ids=[memory.id for memory in memories],
+            embeddings=vectors[start:start + len(memories)].tolist(),
+            documents=[memory.document() for memory in memories],
+            metadatas=[memory.metadata() for memory in memories],
+        )
+
+
+def timed(func, rng: np.random.Generator) -> tuple:
+    func(rng)
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(rng)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def operations(collection) -> dict:
+    return {
+        "query k=5": lambda rng: collection.query(
+            query_embeddings=[rng.normal(size=DIMENSIONS).tolist()], n_results=5
+        ),
+        "get by id": lambda rng: collection.get(ids=[f"m{rng.integers(SIZE)}"]),
+        "timeline page": lambda rng: collection.get(
+            where={"date": {"$gte": 20000101}}, limit=20, include=["metadatas"]
+        ),
+    }
+
+
+def main():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(SIZE, DIMENSIONS)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = free_port()
+        server = start_server(os.path.join(directory, "server"), port)
+        try:
+            modes = {
+                "http": chromadb.HttpClient(host="localhost", port=port),
+                "embedded": chromadb.PersistentClient(path=os.path.join(directory, "embedded")),
+            }
+            results = {}
+            for mode, client in modes.items():
+                collection = client.create_collection(name="vectordb")
+                fill(collection, vectors)
+                for name, func in operations(collection).items():
+                    results[mode, name] = timed(func, np.random.default_rng(1))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{SIZE} memories, {DIMENSIONS} dimensions, {REPEATS} calls each")
+    print(f"{'operation':<14} {'http p50':>9} {'p95':>7} {'embedded p50':>13} {'p95':>7}")
+    for name in operations(None):
+        http, embedded = results["http", name], results["embedded", name]
+        print(f"{name:<14} {http[0]:>8.2f}ms {http[1]:>6.2f}ms "
+              f"{embedded[0]:>12.2f}ms {embedded[1]:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
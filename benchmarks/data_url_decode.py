@@ -0,0 +1,58 @@
+"""Decoding recorder data URLs: urlopen path vs. the pooled decoder.
+
+Reports time per MB and the peak traced allocation for each payload size.
+
+    python -m benchmarks.data_url_decode
+"""
+
+import base64
+import os
+import time
+import tracemalloc
+from urllib.request import urlopen
+
+from reflex_audio_capture import strip_codec_part
+
+from Memento import audio
+
+SIZES_MB = [1, 4, 16]
+ROUNDS = 5
+
+
+def urlopen_path(url: str) -> int:
+    with urlopen(strip_codec_part(url)) as audio_data:
+        return len(audio_data.read())
+
+
+def decoder_path(url: str) -> int:
+    with audio.decode_data_url(url) as decoded:
+        return len(decoded.data)
+
+
+def measure(decode, url: str):
+    decode(url)  # warm up, and fill the buffer pool
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decode(url)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+
+    tracemalloc.start()
+    decode(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    print(f"{'MB':>4} {'path':>8} {'ms/MB':>8} {'peak MB':>8}")
+    for size in SIZES_MB:
+        payload = os.urandom(size * 1024 * 1024)
+        url = "data:audio/webm;codecs=opus;base64," + base64.b64encode(payload).decode("ascii")
+        assert urlopen_path(url) == decoder_path(url) == len(payload)
+        for name, decode in [("urlopen", urlopen_path), ("decoder", decoder_path)]:
+            elapsed, peak = measure(decode, url)
+            print(f"{size:>4} {name:>8} {elapsed * 1000 / size:>8.2f} {peak / 2 ** 20:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Embedding throughput against a local fake embedder.
+
+Compares the old single-request behaviour with batched, concurrent requests.
+The fake embedder sleeps for a fixed round-trip plus a per-text cost, so the
+numbers reflect request scheduling rather than the provider.
+
+    python -m benchmarks.embedding_throughput
+"""
+
+import os
+import tempfile
+import time
+
+from Memento import embeddings
+from Memento.embeddings import EmbeddingCache, GeminiEmbeddingFunction
+
+ROUND_TRIP = 0.08  # seconds per request
+PER_TEXT = 0.002  # seconds per text in a request
+DIMENSIONS = 768
+TEXTS = 2000
+
+
+class FakeEmbeddingFunction(GeminiEmbeddingFunction):
+    def _embed_batch(self, texts: list) -> list:
+        time.sleep(ROUND_TRIP + PER_TEXT * len(texts))
+        return [[float(len(text))] * DIMENSIONS for text in texts]
+
+
+def run(batch_size: int, concurrency: int, texts: list) -> float:
+    embeddings.MAX_CONCURRENCY = concurrency
+    embeddings._pool = None
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(path=os.path.join(tmp, "cache.sqlite3"))
+        function = FakeEmbeddingFunction(cache=cache, batch_size=batch_size)
+        start = time.perf_counter()
+        vectors = function(texts)
+        elapsed = time.perf_counter() - start
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    return elapsed
+
+
+def main():
+    texts = [f"memory {i} " + "x" * (i % 50) for i in range(TEXTS)]
+    print(f"{TEXTS} texts, fake round trip {ROUND_TRIP * 1000:.0f} ms "
+          f"+ {PER_TEXT * 1000:.0f} ms/text")
+    print(f"{'batch':>6} {'workers':>8} {'seconds':>8} {'texts/s':>9}")
+    for batch_size, concurrency in [(TEXTS, 1), (100, 1), (100, 4), (100, 8), (50, 8)]:
+        elapsed = run(batch_size, concurrency, texts)
+        print(f"{batch_size:>6} {concurrency:>8} {elapsed:>8.2f} {TEXTS / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
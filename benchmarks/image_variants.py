@@ -0,0 +1,66 @@
+"""Bytes a timeline row downloads: the original photo vs. its variants.
+
+Saves synthetic 12 MP "phone photos" the way ``handle_upload`` does and runs
+``images.save_variants`` on them, reporting the original's size, each
+variant's size and the time spent encoding variants per upload.  A timeline
+row (a 760 px slot) loads the 800 px variant on a 1x screen and the 1600 px
+one on a 2x screen.
+
+    python -m benchmarks.image_variants
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from Memento import images
+
+PHOTOS = 3
+SIZE = (4032, 3024)
+
+
+def synthetic_photo(rng: np.random.Generator) -> Image.Image:
+    # Smooth gradients plus fine noise compress roughly like a real photo.
+    y, x = np.mgrid[0:SIZE[1], 0:SIZE[0]]
+    base = np.stack([
+        (np.sin(x / rng.uniform(80, 400)) + 1) * 100,
+        (np.cos(y / rng.uniform(80, 400)) + 1) * 100,
+        (x + y) / (SIZE[0] + SIZE[1]) * 255,
+    ], axis=-1)
+    noisy = base + rng.normal(scale=12, size=base.shape)
+    image = Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8), "RGB")
+    return image.filter(ImageFilter.GaussianBlur(0.6))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    totals = {}
+    encode = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        for number in range(PHOTOS):
+            image = synthetic_photo(rng)
+            basename = f"photo{number}"
+            original = os.path.join(directory, f"{basename}.jpg")
+            image.save(original, format="JPEG")
+            totals["original"] = totals.get("original", 0) + os.path.getsize(original)
+
+            start = time.perf_counter()
+            widths = images.save_variants(image, basename, directory)
+            encode += time.perf_counter() - start
+            for width in widths:
+                for ext in ("webp", "jpg"):
+                    name = images.variant_name(basename, width, ext)
+                    key = f"{width}px {ext}"
+                    totals[key] = totals.get(key, 0) + os.path.getsize(os.path.join(directory, name))
+
+    print(f"{'file':>12} {'KB/photo':>9} {'of original':>12}")
+    for key, total in totals.items():
+        print(f"{key:>12} {total / PHOTOS / 1024:>9.1f} {total / totals['original']:>12.1%}")
+    print(f"variant encoding: {encode / PHOTOS * 1000:.0f} ms/upload")
+
+
+if __name__ == "__main__":
+    main()
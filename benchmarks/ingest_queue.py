@@ -0,0 +1,52 @@
+"""Ingest throughput of the SQLite job queue by worker count.
+
+Queues ``JOBS`` uploads in a temporary queue and drains it with
+``ingest.run_workers`` using a stand-in handler that sleeps ``REMOTE_SECONDS``
+(about one caption plus one embedding round trip), so the numbers show how
+the queue and workers scale rather than Gemini's speed.
+
+    python -m benchmarks.ingest_queue
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from Memento import ingest
+from Memento.schema import Memory
+
+JOBS = 200
+REMOTE_SECONDS = 0.25
+WORKER_COUNTS = [1, 2, 4, 8, 16]
+
+
+async def fake_ingest(job: ingest.Job, queue: ingest.JobQueue) -> None:
+    await asyncio.sleep(REMOTE_SECONDS)
+
+
+async def drain(path: str, workers: int) -> float:
+    queue = ingest.JobQueue(path)
+    for number in range(JOBS):
+        queue.enqueue(Memory(id=f"m{number}", date="1972-07-04", description="x"), b"jpeg")
+
+    start = time.perf_counter()
+    task = asyncio.create_task(ingest.run_workers(workers, fake_ingest, queue))
+    while queue.counts().get(ingest.DONE, 0) < JOBS:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    return elapsed
+
+
+def main():
+    print(f"{'workers':>8} {'seconds':>8} {'jobs/s':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in WORKER_COUNTS:
+            path = os.path.join(directory, f"queue_{workers}.sqlite3")
+            elapsed = asyncio.run(drain(path, workers))
+            print(f"{workers:>8} {elapsed:>8.2f} {JOBS / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Preparing a multi-photo upload: one at a time vs. on the process pool.
+
+Encodes ``PHOTOS`` synthetic 12 MP JPEGs (see ``benchmarks.image_variants``)
+and runs ``images.prepare_upload`` on them the way ``handle_upload`` used to
+(sequentially, on the event loop) and the way it does now (concurrently via
+``executor.run_in_process``).  Captioning isn't included; it runs later on
+the ingest workers.
+
+    python -m benchmarks.multi_upload
+"""
+
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Memento import executor, images
+from benchmarks.image_variants import synthetic_photo
+
+PHOTOS = 12
+
+
+async def concurrent(uploads: list[bytes], directory: str) -> None:
+    await asyncio.gather(*(
+        executor.run_in_process(images.prepare_upload, data, f"p{number}", directory)
+        for number, data in enumerate(uploads)
+    ))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    uploads = []
+    for _ in range(PHOTOS):
+        buffer = io.BytesIO()
+        synthetic_photo(rng).save(buffer, format="JPEG")
+        uploads.append(buffer.getvalue())
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for number, data in enumerate(uploads):
+            images.prepare_upload(data, f"s{number}", directory)
+        sequential = time.perf_counter() - start
+
+        # Start the pool's processes before timing.
+        asyncio.run(concurrent(uploads[:executor.CPU_WORKERS], directory))
+        start = time.perf_counter()
+        asyncio.run(concurrent(uploads, directory))
+        pooled = time.perf_counter() - start
+
+    print(f"{PHOTOS} photos, {executor.CPU_WORKERS} worker processes ({os.cpu_count()} CPUs)")
+    print(f"sequential:   {sequential:6.2f}s")
+    print(f"process pool: {pooled:6.2f}s  ({sequential / pooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Prompt size and per-turn overhead: per-turn model vs. the shared model.
+
+The Gemini client is replaced by a stub that records each request and answers
+immediately, so the numbers cover only model construction, request building
+and request size.
+
+    python -m benchmarks.prompt_reuse
+"""
+
+import asyncio
+import time
+
+import google.generativeai as genai
+
+from Memento import assistant, history, retrieval
+from Memento.schema import Memory
+
+TURNS = 10
+MEMORIES = 10
+
+
+class StubClient:
+    def __init__(self):
+        self.requests = []
+
+    async def generate_content(self, request, **kwargs):
+        self.requests.append(request)
+        return genai.protos.GenerateContentResponse(candidates=[{
+            "content": {"role": "model", "parts": [{"text": "What a lovely memory. Tell me more!"}]},
+            "finish_reason": 1,
+        }])
+
+
+def request_bytes(request, without_static_prefix: bool = False) -> int:
+    pb = type(request).pb(request)
+    if without_static_prefix:
+        copy = type(pb)()
+        copy.CopyFrom(pb)
+        copy.ClearField("system_instruction")
+        copy.ClearField("tools")
+        pb = copy
+    return pb.ByteSize()
+
+
+def fake_results(turn: int):
+    memories = [
+        Memory(
+            id=f"00000000-0000-0000-0000-{i:012d}",
+            date=f"19{60 + i}-07-04",
+            description=f"Summer trip number {i} with the family, turn {turn}",
+            summary="A sunny day by the lake with a wooden boat and tall pines. " * 12,
+            filename=f"00000000-0000-0000-0000-{i:012d}",
+        )
+        for i in range(MEMORIES)
+    ]
+    return [
+        retrieval.parse_memory(memory.id, memory.document(), memory.metadata())
+        for memory in memories
+    ]
+
+
+async def per_turn_model(stub: StubClient) -> float:
+    """The old flow: memories baked into a fresh system instruction."""
+    exchanges, summary = [], ""
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        memories = assistant.format_memories(fake_results(turn))
+        model = genai.GenerativeModel(
+            model_name=assistant.MODEL_NAME,
+            system_instruction=f"{assistant.PERSONA}\n<data>\n{memories}\n</data>",
+            tools=[assistant.fileNameGrabber],
+        )
+        model._async_client = stub
+        chat = model.start_chat(history=history.to_gemini_history(exchanges, summary))
+        user_text = f"Tell me about the lake, turn {turn}"
+        response = await chat.send_message_async(user_text)
+        exchanges, summary = history.add_exchange(exchanges, summary, user_text, response.text)
+    return time.perf_counter() - start
+
+
+async def shared_model(stub: StubClient) -> float:
+    """The new flow: one model, memories in the turn message."""
+    exchanges, summary = [], ""
+    start = time.perf_counter()
+    model = assistant.get_model()
+    model._async_client = stub
+    for turn in range(TURNS):
+        memories = assistant.format_memories(fake_results(turn))
+        chat = model.start_chat(history=history.to_gemini_history(exchanges, summary))
+        user_text = f"Tell me about the lake, turn {turn}"
+        response = await chat.send_message_async(assistant.build_turn_message(memories, user_text))
+        exchanges, summary = history.add_exchange(exchanges, summary, user_text, response.text)
+    return time.perf_counter() - start
+
+
+def main():
+    assistant.USE_CONTEXT_CACHE = False
+    old, new = StubClient(), StubClient()
+    old_seconds = asyncio.run(per_turn_model(old))
+    new_seconds = asyncio.run(shared_model(new))
+
+    old_bytes = sum(request_bytes(r) for r in old.requests)
+    new_bytes = sum(request_bytes(r) for r in new.requests)
+    cached_bytes = sum(request_bytes(r, without_static_prefix=True) for r in new.requests)
+    print(f"{TURNS} turns, {MEMORIES} memories per turn")
+    print(f"{'flow':<28} {'bytes/turn':>10} {'ms/turn':>8}")
+    print(f"{'per-turn model':<28} {old_bytes / TURNS:>10.0f} {old_seconds * 1000 / TURNS:>8.2f}")
+    print(f"{'shared model':<28} {new_bytes / TURNS:>10.0f} {new_seconds * 1000 / TURNS:>8.2f}")
+    print(f"{'shared model + cached prefix':<28} {cached_bytes / TURNS:>10.0f} {'':>8}")
+
+
+if __name__ == "__main__":
+    main()
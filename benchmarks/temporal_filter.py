@@ -0,0 +1,87 @@
+"""Date-filtered vs. unfiltered memory search on large collections.
+
+Builds an in-process Chroma collection of synthetic memories (clustered
+random vectors, random dates between 1940 and 2024) and runs the same
+"tell me about <topic> in <year>" queries with and without the ``where``
+filter produced by ``Memento.temporal``.  Precision is the share of returned
+memories that actually fall in the asked-about year.
+
+    python -m benchmarks.temporal_filter
+"""
+
+import random
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from Memento import temporal
+
+SIZES = [10_000, 50_000]
+DIMENSIONS = 768
+TOPICS = 50
+QUERIES = 50
+N_RESULTS = 10
+BATCH = 5000
+
+
+def build(client, size: int, rng: np.random.Generator):
+    centers = rng.normal(size=(TOPICS, DIMENSIONS)).astype(np.float32)
+    collection = client.create_collection(name=f"bench_{size}")
+    for start in range(0, size, BATCH):
+        count = min(BATCH, size - start)
+        topics = rng.integers(0, TOPICS, count)
+        vectors = centers[topics] + rng.normal(scale=0.8, size=(count, DIMENSIONS)).astype(np.float32)
+        years = rng.integers(1940, 2025, count)
+        collection.add(
+            ids=[str(start + i) for i in range(count)],
+            embeddings=vectors.tolist(),
+            metadatas=[
+                {"date": int(year) * 10000 + 615, "topic": int(topic)}
+                for year, topic in zip(years, topics)
+            ],
+        )
+    return collection, centers
+
+
+def run(collection, centers, rng: np.random.Generator, filtered: bool):
+    random.seed(0)
+    elapsed = 0.0
+    hits = returned = 0
+    for _ in range(QUERIES):
+        topic = random.randrange(TOPICS)
+        year = random.randrange(1940, 2025)
+        vector = centers[topic] + rng.normal(scale=0.8, size=DIMENSIONS).astype(np.float32)
+        date_range = temporal.extract_date_range(f"tell me about the trip in {year}")
+        where = temporal.where_filter(date_range) if filtered else None
+
+        start = time.perf_counter()
+        results = collection.query(
+            query_embeddings=[vector.tolist()], n_results=N_RESULTS, where=where,
+            include=["metadatas"],
+        )
+        elapsed += time.perf_counter() - start
+
+        for metadata in results["metadatas"][0]:
+            returned += 1
+            hits += date_range[0] <= metadata["date"] <= date_range[1]
+    return elapsed / QUERIES, hits / max(returned, 1)
+
+
+def main():
+    print(f"{'memories':>9} {'search':>10} {'ms/query':>9} {'precision':>10}")
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(
+            path=path, settings=chromadb.Settings(anonymized_telemetry=False)
+        )
+        for size in SIZES:
+            collection, centers = build(client, size, np.random.default_rng(size))
+            for filtered in (False, True):
+                latency, precision = run(collection, centers, np.random.default_rng(1), filtered)
+                label = "date where" if filtered else "unfiltered"
+                print(f"{size:>9} {label:>10} {latency * 1000:>9.2f} {precision:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
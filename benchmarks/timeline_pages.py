@@ -0,0 +1,100 @@
+"""Family timeline load time: whole collection vs. cursor pages.
+
+Builds an in-process Chroma collection of synthetic memories (dates spread
+over 1940-2024) and compares the old ``/family`` load — fetch every record,
+sort in Python — with the window scan (``timeline.scan_page``) and the
+materialized ``timeline.TimelineIndex``, for the first page and for pages deep
+into the timeline.  Only metadata is read, so the vectors are tiny.
+
+    python -m benchmarks.timeline_pages
+"""
+
+import tempfile
+import time
+from datetime import date, timedelta
+
+import chromadb
+import numpy as np
+
+from Memento import timeline
+from Memento.schema import Memory
+
+SIZES = [10_000, 100_000]
+DIMENSIONS = 8
+BATCH = 5000
+REPEATS = 5
+DEEP_PAGES = [50, 200]
+
+
+def build(client, size: int, rng: np.random.Generator):
+    collection = client.create_collection(name=f"bench_{size}")
+    start_day = date(1940, 1, 1)
+    span = (date(2024, 12, 31) - start_day).days
+    for start in range(0, size, BATCH):
+        count = min(BATCH, size - start)
+        offsets = rng.integers(0, span, count)
+        memories = [
+            Memory(
+                id=f"m{start + i}",
+                date=(start_day + timedelta(days=int(offset))).isoformat(),
+                description=f"Synthetic memory number {start + i}",
+                filename=f"m{start + i}",
+                image=f"m{start + i}.jpg",
+            )
+            for i, offset in enumerate(offsets)
+        ]
+        collection.add(
+            ids=[memory.id for memory in memories],
+            embeddings=rng.normal(size=(count, DIMENSIONS)).tolist(),
+            metadatas=[memory.metadata() for memory in memories],
+        )
+    return collection
+
+
+def load_all(collection):
+    results = collection.get(include=["metadatas"])
+    rows = sorted(results["metadatas"], key=lambda metadata: metadata["date"], reverse=True)
+    return [timeline.to_row("", metadata) for metadata in rows]
+
+
+def timed(func):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'memories':>9} {'load':>16} {'ms':>9} {'rows':>7}")
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(
+            path=path, settings=chromadb.Settings(anonymized_telemetry=False)
+        )
+        for size in SIZES:
+            collection = build(client, size, np.random.default_rng(size))
+
+            elapsed, rows = timed(lambda: load_all(collection))
+            print(f"{size:>9} {'everything':>16} {elapsed * 1000:>9.3f} {len(rows):>7}")
+
+            index = timeline.TimelineIndex()
+            elapsed, _ = timed(lambda: index.build(collection))
+            print(f"{size:>9} {'index build':>16} {elapsed * 1000:>9.3f} {len(index._keys):>7}")
+
+            for name, fetch in (("scan", lambda cursor: timeline.scan_page(collection, cursor)),
+                                ("index", index.page)):
+                elapsed, (rows, cursor) = timed(lambda: fetch(""))
+                print(f"{size:>9} {f'{name} page 1':>16} {elapsed * 1000:>9.3f} {len(rows):>7}")
+                page = 1
+                for target in DEEP_PAGES:
+                    while page < target:
+                        _, cursor = fetch(cursor)
+                        page += 1
+                    elapsed, (rows, _) = timed(lambda: fetch(cursor))
+                    label = f"{name} page {target + 1}"
+                    print(f"{size:>9} {label:>16} {elapsed * 1000:>9.3f} {len(rows):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import io
+import zipfile
+
+import chromadb
+import numpy as np
+import pytest
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from PIL import Image
+
+from Memento import bulk_import
+from Memento.photo_index import PhotoIndex
+
+
+class FakeEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __call__(self, input: Documents) -> Embeddings:
+        return [
+            np.frombuffer(hashlib.sha256(text.encode()).digest(), dtype=np.uint8).astype(np.float32)
+            for text in input
+        ]
+
+
+class FakeCaptioner:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, image_jpeg: bytes) -> str:
+        self.calls += 1
+        return f"caption {self.calls}"
+
+
+def photo(seed: int, format: str = "JPEG", quality: int = 95) -> bytes:
+    """A smooth random picture, so re-encoding keeps its perceptual hash."""
+    pixels = np.random.default_rng(seed).integers(0, 256, (8, 9, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize((180, 160), Image.Resampling.BILINEAR).save(
+        buffer, format=format, **({"quality": quality} if format == "JPEG" else {})
+    )
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def setup(tmp_path):
+    folder = tmp_path / "photos"
+    (folder / "sub").mkdir(parents=True)
+    (folder / "a.jpg").write_bytes(photo(1))
+    (folder / "b.png").write_bytes(photo(2, "PNG"))
+    (folder / "sub" / "c.jpg").write_bytes(photo(3))
+    (folder / "notes.txt").write_text("not a photo")
+
+    archive = tmp_path / "photos.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("copy_of_a.jpg", photo(1))
+        zf.writestr("b_reencoded.jpg", photo(2, quality=70))
+        zf.writestr("d.jpg", photo(4))
+
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    collection = client.create_collection("vectordb", embedding_function=FakeEmbeddingFunction())
+    return {
+        "folder": str(folder),
+        "archive": str(archive),
+        "collection": collection,
+        "captioner": FakeCaptioner(),
+        "index": PhotoIndex(str(tmp_path / "photo_index.sqlite3")),
+        "upload_dir": str(tmp_path / "uploads"),
+        "checkpoint": str(tmp_path / "photos.imported"),
+    }
+
+
+def run(setup, source: str, checkpoint: str = ""):
+    return asyncio.run(bulk_import.run_import(
+        source,
+        setup["collection"],
+        captioner=setup["captioner"],
+        checkpoint=checkpoint,
+        upload_dir=setup["upload_dir"],
+        batch_size=2,
+        index=setup["index"],
+    ))
+
+
+def test_folder_import_and_checkpoint_resume(setup):
+    stats = run(setup, setup["folder"], setup["checkpoint"])
+    assert (stats.imported, stats.skipped, stats.unreadable, stats.uncaptioned) == (3, 0, 0, 0)
+    assert setup["collection"].count() == 3
+    assert setup["captioner"].calls == 3
+
+    stats = run(setup, setup["folder"], setup["checkpoint"])
+    assert (stats.imported, stats.skipped) == (0, 3)
+    assert setup["collection"].count() == 3
+    assert setup["captioner"].calls == 3
+
+
+def test_zip_import_reuses_duplicates(setup):
+    run(setup, setup["folder"])
+    stats = run(setup, setup["archive"])
+
+    # The exact copy of a.jpg keeps its id; the re-encoded b is a new memory
+    # sharing b's files and caption.  Only d.jpg needs a caption call.
+    assert stats.imported == 3
+    assert setup["collection"].count() == 5
+    assert setup["captioner"].calls == 4
+
+    records = setup["collection"].get(include=["metadatas"])["metadatas"]
+    by_hash = {}
+    for metadata in records:
+        by_hash.setdefault(metadata["photo_hash"], []).append(metadata)
+    assert sorted(len(copies) for copies in by_hash.values()) == [1, 1, 1, 2]
+    b, b_reencoded = next(copies for copies in by_hash.values() if len(copies) == 2)
+    assert b["image"] == b_reencoded["image"]
+    assert b["summary"] == b_reencoded["summary"] != ""
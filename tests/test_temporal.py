@@ -0,0 +1,40 @@
+from datetime import date
+
+from Memento.temporal import extract_date_range
+
+TODAY = date(2024, 5, 1)
+
+
+def test_decades():
+    assert extract_date_range("Back in the seventies", TODAY) == (19700101, 19791231)
+    assert extract_date_range("the late sixties", TODAY) == (19660101, 19691231)
+    assert extract_date_range("the 80s were fun", TODAY) == (19800101, 19891231)
+
+
+def test_ages_are_not_decades():
+    assert extract_date_range("when I was in my twenties", TODAY) is None
+    assert extract_date_range("in my forties we moved", TODAY) is None
+    assert extract_date_range("in her early 80s", TODAY) is None
+    assert extract_date_range("in Dad's sixties, in the seventies", TODAY) == (19700101, 19791231)
+
+
+def test_years_need_context():
+    assert extract_date_range("I have 2000 reasons", TODAY) is None
+    assert extract_date_range("back in 1972", TODAY) == (19720101, 19721231)
+    assert extract_date_range("from 1970 to 1975", TODAY) == (19700101, 19751231)
+    assert extract_date_range("the house cost 1950 and then 1960", TODAY) is None
+
+
+def test_years_ago():
+    assert extract_date_range("twenty five years ago", TODAY) == (19980101, 20001231)
+    assert extract_date_range("thirty-five years ago", TODAY) == (19880101, 19901231)
+    assert extract_date_range("eighty years ago", TODAY) == (19430101, 19451231)
+    assert extract_date_range("sixty years ago we married", TODAY) == (19630101, 19651231)
+    assert extract_date_range("five years ago", TODAY) == (20180101, 20201231)
+
+
+def test_winter_in_january():
+    january = date(2024, 1, 15)
+    assert extract_date_range("this winter", january) == (20231201, 20240228)
+    assert extract_date_range("last winter", january) == (20221201, 20230228)
+    assert extract_date_range("this winter", date(2024, 12, 20)) == (20241201, 20250228)